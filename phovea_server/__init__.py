@@ -38,6 +38,42 @@ def phovea(registry):
       'format': 'json',
       'factory': 'parse_json'
   })
+  registry.append('graph-parser', 'parser-json-stream', 'phovea_server.graph_parser', {
+      'format': 'json-stream',
+      'factory': 'parse_json_stream'
+  })
+  registry.append('graph-batch-parser', 'batch-parser-json', 'phovea_server.graph_parser', {
+      'format': 'json',
+      'factory': 'iter_json_upload'
+  })
+  registry.append('graph-batch-parser', 'batch-parser-json-stream', 'phovea_server.graph_parser', {
+      'format': 'json-stream',
+      'factory': 'iter_json_upload'
+  })
+  registry.append('graph-formatter', 'formatter-csv', 'phovea_server.graph_formats', {
+      'format': 'csv',
+      'factory': 'format_csv'
+  })
+  registry.append('graph-parser', 'parser-csv', 'phovea_server.graph_formats', {
+      'format': 'csv',
+      'factory': 'parse_csv'
+  })
+  registry.append('graph-formatter', 'formatter-graphml', 'phovea_server.graph_formats', {
+      'format': 'graphml',
+      'factory': 'format_graphml'
+  })
+  registry.append('graph-parser', 'parser-graphml', 'phovea_server.graph_formats', {
+      'format': 'graphml',
+      'factory': 'parse_graphml'
+  })
+  registry.append('graph-formatter', 'formatter-npz', 'phovea_server.graph_formats', {
+      'format': 'npz',
+      'factory': 'format_npz'
+  })
+  registry.append('graph-parser', 'parser-npz', 'phovea_server.graph_formats', {
+      'format': 'npz',
+      'factory': 'parse_npz'
+  })
   registry.append('command', 'api', 'phovea_server.server', {'isDefault': True})
 
 
@@ -0,0 +1,394 @@
+###############################################################################
+# Caleydo - Visualization for Molecular Biology - http://caleydo.org
+# Copyright (c) The Caleydo Team. All rights reserved.
+# Licensed under the new BSD license, available at http://caleydo.org/license
+###############################################################################
+
+
+from builtins import object
+import numpy as np
+from .graph import AGraph, GraphNode, GraphEdge
+
+_INITIAL_CAPACITY = 16
+# number of rows appended since the last sort, which are looked up via a dict before the keys are sorted again
+_MAX_UNSORTED = 1024
+
+
+class _Table(object):
+  """
+  growable set of equally long numpy columns with a lookup of the rows by the values of the key column
+  """
+
+  def __init__(self, key, dtypes):
+    self.key = key
+    self.size = 0
+    self._columns = {name: np.empty(_INITIAL_CAPACITY, dtype=dtype) for name, dtype in dtypes.items()}
+    # sorted keys and their rows, None if outdated
+    self._sorted = None
+    # key -> row of the rows appended after the keys were sorted
+    self._unsorted = {}
+
+  def __len__(self):
+    return self.size
+
+  def column(self, name):
+    return self._columns[name][:self.size]
+
+  def get(self, name, row):
+    return self._columns[name][row]
+
+  def set(self, name, row, value):
+    self._columns[name][row] = value
+    if name == self.key:
+      self._invalidate()
+
+  def _invalidate(self):
+    self._sorted = None
+    self._unsorted.clear()
+
+  def _ensure_capacity(self, size):
+    capacity = len(self._columns[self.key])
+    if size <= capacity:
+      return
+    capacity = max(size, capacity * 2)
+    for name, c in self._columns.items():
+      grown = np.empty(capacity, dtype=c.dtype)
+      grown[:self.size] = c[:self.size]
+      self._columns[name] = grown
+
+  def append(self, **values):
+    row = self.size
+    self._ensure_capacity(row + 1)
+    for name, v in values.items():
+      self._columns[name][row] = v
+    self.size += 1
+    if self._sorted is not None:
+      self._unsorted[values[self.key]] = row
+      if len(self._unsorted) > max(_MAX_UNSORTED, self.size // 8):
+        self._invalidate()
+    return row
+
+  def extend(self, **arrays):
+    n = len(arrays[self.key])
+    self._ensure_capacity(self.size + n)
+    for name, v in arrays.items():
+      self._columns[name][self.size:self.size + n] = v
+    self.size += n
+    self._invalidate()
+
+  def remove(self, row):
+    """
+    removes the given row by moving the last row into its place
+    """
+    last = self.size - 1
+    if row != last:
+      for c in self._columns.values():
+        c[row] = c[last]
+    self.size -= 1
+    self._invalidate()
+
+  def compress(self, keep):
+    """
+    keeps only the rows of the given boolean mask
+    """
+    for name, c in self._columns.items():
+      kept = c[:self.size][keep]
+      c[:len(kept)] = kept
+    self.size = int(np.count_nonzero(keep))
+    self._invalidate()
+
+  def clear(self):
+    self.size = 0
+    self._invalidate()
+
+  def row(self, key):
+    """
+    :return: the row of the given key or -1 if it is unknown
+    """
+    r = self._unsorted.get(key)
+    if r is not None:
+      return r
+    if self._sorted is None:
+      rows = np.argsort(self.column(self.key), kind='stable')
+      self._sorted = self.column(self.key)[rows], rows
+    keys, rows = self._sorted
+    i = int(np.searchsorted(keys, key))
+    if i < len(keys) and keys[i] == key:
+      return int(rows[i])
+    return -1
+
+
+class _Views(object):
+  """
+  lazy sequence creating the view of an element on access
+  """
+
+  def __init__(self, n, create):
+    self._n = n
+    self._create = create
+
+  def __len__(self):
+    return self._n
+
+  def __getitem__(self, i):
+    if i < 0:
+      i += self._n
+    if not 0 <= i < self._n:
+      raise IndexError(i)
+    return self._create(i)
+
+  def __iter__(self):
+    return (self._create(i) for i in range(self._n))
+
+
+def _to_int(v):
+  try:
+    return int(v)
+  except (TypeError, ValueError):
+    return None
+
+
+class ColumnarGraph(AGraph):
+  """
+  in-memory graph storing its nodes and edges in numpy columns instead of objects: the integer ids, the sources and
+  targets of the edges and the interned types. Attributes are kept in sparse columns, i.e. a dict per attribute name
+  containing the values of the elements having that attribute. GraphNode and GraphEdge objects are created on access
+  as views of the current state, changes have to be done via the update methods.
+  The order of the elements changes when elements are removed.
+  """
+  local_changes = True
+
+  def __init__(self, name, project, id=None, attrs=None, nodes=(), edges=()):
+    """
+    :param nodes: list of node dicts with the keys type, id and attrs
+    :param edges: list of edge dicts with the keys type, id, source, target and attrs
+    """
+    super(ColumnarGraph, self).__init__(name, project, id, attrs)
+    self._types = []
+    self._type_codes = {}
+    self._nodes = _Table('id', dict(id=np.int64, type=np.int32))
+    self._edges = _Table('id', dict(id=np.int64, type=np.int32, source=np.int64, target=np.int64))
+    # attribute name -> {element id: value}
+    self._node_attrs = {}
+    self._edge_attrs = {}
+    # column name -> (sorted node ids, edge rows) of the source and target columns, None if outdated
+    self._adjacency = None
+    self._load(nodes, edges)
+
+  def _load(self, nodes, edges):
+    nodes = list(nodes)
+    edges = list(edges)
+    self._nodes.extend(id=np.fromiter((n['id'] for n in nodes), dtype=np.int64, count=len(nodes)),
+                       type=np.fromiter((self._intern(n.get('type', 'node')) for n in nodes), dtype=np.int32,
+                                        count=len(nodes)))
+    self._edges.extend(id=np.fromiter((e['id'] for e in edges), dtype=np.int64, count=len(edges)),
+                       type=np.fromiter((self._intern(e.get('type', 'edge')) for e in edges), dtype=np.int32,
+                                        count=len(edges)),
+                       source=np.fromiter((e['source'] for e in edges), dtype=np.int64, count=len(edges)),
+                       target=np.fromiter((e['target'] for e in edges), dtype=np.int64, count=len(edges)))
+    for n in nodes:
+      _set_attrs(self._node_attrs, int(n['id']), n.get('attrs'))
+    for e in edges:
+      _set_attrs(self._edge_attrs, int(e['id']), e.get('attrs'))
+
+  def _intern(self, t):
+    code = self._type_codes.get(t)
+    if code is None:
+      code = self._type_codes[t] = len(self._types)
+      self._types.append(t)
+    return code
+
+  def _node_view(self, row):
+    id = int(self._nodes.get('id', row))
+    return GraphNode(self._types[self._nodes.get('type', row)], id, _get_attrs(self._node_attrs, id))
+
+  def _edge_view(self, row):
+    e = self._edges
+    id = int(e.get('id', row))
+    return GraphEdge(self._types[e.get('type', row)], id, int(e.get('source', row)), int(e.get('target', row)),
+                     _get_attrs(self._edge_attrs, id))
+
+  def nodes(self):
+    return _Views(len(self._nodes), self._node_view)
+
+  def edges(self):
+    return _Views(len(self._edges), self._edge_view)
+
+  @property
+  def nnodes(self):
+    return len(self._nodes)
+
+  @property
+  def nedges(self):
+    return len(self._edges)
+
+  def _json_rows(self, name, start, end):
+    types = self._types
+    if name == 'nodes':
+      n = self._nodes
+      return [dict(type=types[t], id=id, attrs=_get_attrs(self._node_attrs, id))
+              for id, t in zip(n.column('id')[start:end].tolist(), n.column('type')[start:end].tolist())]
+    e = self._edges
+    return [dict(type=types[t], id=id, source=s, target=tt, attrs=_get_attrs(self._edge_attrs, id))
+            for id, t, s, tt in zip(e.column('id')[start:end].tolist(), e.column('type')[start:end].tolist(),
+                                    e.column('source')[start:end].tolist(), e.column('target')[start:end].tolist())]
+
+  def asjson(self):
+    return dict(nodes=self._json_rows('nodes', 0, len(self._nodes)), edges=self._json_rows('edges', 0, len(self._edges)))
+
+  def iter_json(self, name, chunk_size=1000):
+    n = len(self._nodes if name == 'nodes' else self._edges)
+    for i in range(0, n, chunk_size):
+      yield self._json_rows(name, i, i + chunk_size)
+
+  def columns(self):
+    """
+    :return: dict with copies of the columns: node_ids, node_types, edge_ids, edge_types, edge_sources and
+    edge_targets as numpy arrays, the type codes refer to the list types, node_attrs and edge_attrs are the sparse
+    attribute columns
+    """
+    n, e = self._nodes, self._edges
+    return dict(node_ids=n.column('id').copy(), node_types=n.column('type').copy(), edge_ids=e.column('id').copy(),
+                edge_types=e.column('type').copy(), edge_sources=e.column('source').copy(),
+                edge_targets=e.column('target').copy(), types=list(self._types),
+                node_attrs={k: dict(c) for k, c in self._node_attrs.items()},
+                edge_attrs={k: dict(c) for k, c in self._edge_attrs.items()})
+
+  def get_node(self, id):
+    id = _to_int(id)
+    row = self._nodes.row(id) if id is not None else -1
+    return self._node_view(row) if row >= 0 else None
+
+  def get_edge(self, id):
+    id = _to_int(id)
+    row = self._edges.row(id) if id is not None else -1
+    return self._edge_view(row) if row >= 0 else None
+
+  def add_node(self, data):
+    id = _to_int(data.get('id'))
+    if id is None or self._nodes.row(id) >= 0:
+      return False
+    self._nodes.append(id=id, type=self._intern(data.get('type', 'node')))
+    _set_attrs(self._node_attrs, id, data.get('attrs'))
+    return True
+
+  def update_node(self, data):
+    id = _to_int(data.get('id'))
+    row = self._nodes.row(id) if id is not None else -1
+    if row < 0:
+      return False
+    if 'type' in data:
+      self._nodes.set('type', row, self._intern(data['type']))
+    if 'attrs' in data:
+      _remove_attrs(self._node_attrs, id)
+      _set_attrs(self._node_attrs, id, data['attrs'])
+    return True
+
+  def remove_node(self, id):
+    id = _to_int(id)
+    row = self._nodes.row(id) if id is not None else -1
+    if row < 0:
+      return False
+    self._nodes.remove(row)
+    _remove_attrs(self._node_attrs, id)
+    # remove the incoming and outgoing edges, too
+    e = self._edges
+    incident = (e.column('source') == id) | (e.column('target') == id)
+    self.report_removed_edges(int(incident.sum()))
+    if incident.any():
+      for edge_id in e.column('id')[incident].tolist():
+        _remove_attrs(self._edge_attrs, edge_id)
+      e.compress(~incident)
+      self._adjacency = None
+    return True
+
+  def add_edge(self, data):
+    id, source, target = _to_int(data.get('id')), _to_int(data.get('source')), _to_int(data.get('target'))
+    if id is None or source is None or target is None or self._edges.row(id) >= 0 or \
+       self._nodes.row(source) < 0 or self._nodes.row(target) < 0:
+      return False
+    self._edges.append(id=id, type=self._intern(data.get('type', 'edge')), source=source, target=target)
+    _set_attrs(self._edge_attrs, id, data.get('attrs'))
+    self._adjacency = None
+    return True
+
+  def update_edge(self, data):
+    id = _to_int(data.get('id'))
+    row = self._edges.row(id) if id is not None else -1
+    if row < 0:
+      return False
+    e = self._edges
+    source, target = _to_int(data.get('source', e.get('source', row))), _to_int(data.get('target', e.get('target', row)))
+    if source is None or target is None or self._nodes.row(source) < 0 or self._nodes.row(target) < 0:
+      return False
+    if 'type' in data:
+      e.set('type', row, self._intern(data['type']))
+    e.set('source', row, source)
+    e.set('target', row, target)
+    if 'attrs' in data:
+      _remove_attrs(self._edge_attrs, id)
+      _set_attrs(self._edge_attrs, id, data['attrs'])
+    self._adjacency = None
+    return True
+
+  def remove_edge(self, id):
+    id = _to_int(id)
+    row = self._edges.row(id) if id is not None else -1
+    if row < 0:
+      return False
+    self._edges.remove(row)
+    _remove_attrs(self._edge_attrs, id)
+    self._adjacency = None
+    return True
+
+  def clear(self):
+    self._nodes.clear()
+    self._edges.clear()
+    self._node_attrs.clear()
+    self._edge_attrs.clear()
+    self._adjacency = None
+    return True
+
+  def _edge_rows(self, column, node_id):
+    """
+    :return: the rows of the edges whose source or target column is the given node id
+    """
+    if self._adjacency is None:
+      e = self._edges
+      sources, targets = e.column('source'), e.column('target')
+      by_source, by_target = np.argsort(sources, kind='stable'), np.argsort(targets, kind='stable')
+      self._adjacency = dict(source=(sources[by_source], by_source), target=(targets[by_target], by_target))
+    keys, rows = self._adjacency[column]
+    return rows[np.searchsorted(keys, node_id, 'left'):np.searchsorted(keys, node_id, 'right')].tolist()
+
+  def incoming_edges(self, node):
+    return (self._edge_view(row) for row in self._edge_rows('target', node.id))
+
+  def outgoing_edges(self, node):
+    return (self._edge_view(row) for row in self._edge_rows('source', node.id))
+
+  def resolve_edges(self, edges):
+    edges = list(edges)
+    n = {}
+    for e in edges:
+      for id in (e.source, e.target):
+        if id not in n:
+          n[id] = self.get_node(id)
+    return ((e, n[e.source], n[e.target]) for e in edges)
+
+
+def _set_attrs(columns, id, attrs):
+  for k, v in (attrs or {}).items():
+    columns.setdefault(k, {})[id] = v
+
+
+def _get_attrs(columns, id):
+  return {k: c[id] for k, c in columns.items() if id in c}
+
+
+def _remove_attrs(columns, id):
+  for k in list(columns.keys()):
+    c = columns[k]
+    c.pop(id, None)
+    if not c:
+      del columns[k]
@@ -9,16 +9,180 @@ from builtins import str
 import phovea_server.plugin
 import phovea_server.util
 from phovea_server.dataset_def import to_idtype_description
+from phovea_server.dataset_index import DataSetIndex
+from collections import OrderedDict
 import itertools
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import logging
 
+_log = logging.getLogger(__name__)
 _providers_r = None
+# list of futures of the providers while they are initialized concurrently
+_provider_futures = None
+# the plugins of the futures in the same order
+_provider_plugins = None
+# plugins whose provider failed to initialize concurrently, they are retried on the next access
+_failed_plugins = []
+# time of the last retry of the failed plugins
+_failed_retry = 0
+_providers_lock = threading.Lock()
+# plugin id -> initialization time of the provider in seconds
+_provider_init_times = {}
+_index = DataSetIndex()
+# (catalog key, list of idtype descriptions)
+_idtype_catalog = None
+# distinguishes the index versions of different processes
+_process_token = phovea_server.util.random_id(8)
+
+
+def _load_provider(p):
+  start = time.time()
+  provider = p.load().factory()
+  elapsed = time.time() - start
+  _provider_init_times[p.id] = elapsed
+  _log.info('initialized dataset provider %s in %.3fs', p.id, elapsed)
+  if hasattr(provider, 'add_change_listener'):
+    provider.add_change_listener(_on_provider_change)
+  return provider
+
+
+def init_providers(parallel=None):
+  """
+  initializes the dataset providers if not already done
+  :param parallel: whether the providers are initialized concurrently in the background, by default the
+  `phovea_server.dataset.parallel_init` setting
+  """
+  global _providers_r, _provider_futures, _provider_plugins
+  from phovea_server.config import view
+  cc = view('phovea_server.dataset')
+  with _providers_lock:
+    if _providers_r is not None or _provider_futures is not None:
+      return
+    plugins = phovea_server.plugin.list('dataset-provider')
+    if parallel is None:
+      parallel = cc.getboolean('parallel_init', default=False)
+    if not parallel:
+      _providers_r = [_load_provider(p) for p in plugins]
+      return
+    executor = ThreadPoolExecutor(max_workers=max(1, cc.getint('max_workers', default=4)),
+                                  thread_name_prefix='dataset-provider')
+    _provider_plugins = list(plugins)
+    _provider_futures = [executor.submit(_load_provider, p) for p in plugins]
+    executor.shutdown(wait=False)
+
+
+def _result(plugin, future):
+  """
+  :return: the provider of the given future or None if its initialization failed
+  """
+  try:
+    return future.result()
+  except Exception:
+    _log.exception('failed to initialize dataset provider %s', plugin.id)
+    return None
+
+
+def _retry_failed():
+  """
+  initializes the providers that failed to initialize concurrently again, at most every retry_interval seconds
+  """
+  global _failed_retry
+  from phovea_server.config import view
+  with _providers_lock:
+    if not _failed_plugins or time.time() - _failed_retry < view('phovea_server.dataset').getint('retry_interval', default=60):
+      return
+    _failed_retry = time.time()
+    for p in list(_failed_plugins):
+      try:
+        _providers_r.append(_load_provider(p))
+        _failed_plugins.remove(p)
+      except Exception:
+        _log.exception('failed to initialize dataset provider %s again', p.id)
 
 
 def _providers():
-  global _providers_r
+  global _providers_r, _failed_retry
   if _providers_r is None:
-    _providers_r = [p.load().factory() for p in phovea_server.plugin.list('dataset-provider')]
-  return _providers_r
+    init_providers()
+  if _providers_r is not None:
+    if _failed_plugins:
+      _retry_failed()
+    return _providers_r
+  futures = _provider_futures
+  if all(f.done() for f in futures):
+    with _providers_lock:
+      if _providers_r is None:
+        results = [(p, _result(p, f)) for p, f in zip(_provider_plugins, futures)]
+        # failed providers are skipped and retried later instead of failing every lookup
+        _failed_plugins[:] = [p for p, r in results if r is None]
+        _failed_retry = time.time()
+        _providers_r = [r for _, r in results if r is not None]
+    return _providers_r
+  from phovea_server.config import view
+  if view('phovea_server.dataset').getboolean('skip_loading', default=False):
+    # providers still loading are skipped, their datasets are indexed on the next access after they are ready
+    done = [_result(p, f) for p, f in zip(_provider_plugins, futures) if f.done()]
+  else:
+    done = [_result(p, f) for p, f in zip(_provider_plugins, futures)]
+  return [r for r in done if r is not None]
+
+
+def provider_init_times():
+  """
+  :return: dict of the plugin id to the initialization time of the dataset provider in seconds
+  """
+  return dict(_provider_init_times)
+
+
+def _is_indexed(provider):
+  """
+  :return: whether the datasets of the given provider are kept in the dataset index, i.e. the provider is static or
+  fires change events. The datasets of all other providers are iterated live.
+  """
+  return getattr(provider, 'static', False) or getattr(provider, 'fires_change_events', False)
+
+
+def _live_providers():
+  return [p for p in _providers() if not _is_indexed(p)]
+
+
+def _on_provider_change(provider, event, entry):
+  if not _index.has_provider(provider):
+    return  # not yet indexed
+  if event == 'reset' or entry is None:
+    _index.reset_provider(provider)
+  elif event == 'remove':
+    _invalidate_description(entry)
+    _index.remove(entry)
+  elif event == 'update':
+    _invalidate_description(entry)
+    _index.update(entry)
+  else:
+    _index.add(provider, entry)
+
+
+def _invalidate_description(entry):
+  if hasattr(entry, 'invalidate_description'):
+    entry.invalidate_description()
+
+
+def _get_index():
+  """
+  :return: the dataset index, indexing the not yet indexed providers
+  """
+  for p in _providers():
+    if _is_indexed(p) and not _index.has_provider(p):
+      _index.add_provider(p)
+  return _index
+
+
+def invalidate():
+  """
+  drops the dataset index, such that all providers are scanned again on the next access
+  """
+  _index.clear()
 
 
 def iter():
@@ -26,7 +190,36 @@ def iter():
   an iterator of all known datasets
   :return:
   """
-  return itertools.chain(*_providers())
+  index = _get_index()
+  live = _live_providers()
+  if not live:
+    return index.__iter__()
+  return itertools.chain(index, *live)
+
+
+def count():
+  """
+  :return: the number of known datasets
+  """
+  return len(_get_index()) + sum(sum(1 for _ in p) for p in _live_providers())
+
+
+def _matches(entry, id, type, fqname):
+  return all(prefix is None or str(getattr(entry, key, '')).startswith(prefix)
+             for key, prefix in (('id', id), ('type', type), ('fqname', fqname)))
+
+
+def find(id=None, type=None, fqname=None):
+  """
+  finds the datasets whose id, type and fqname start with the given prefixes using the dataset index
+  :return: list of matching datasets or None if no prefix was given
+  """
+  hits = _get_index().find(id=id, type=type, fqname=fqname)
+  if hits is None:
+    return None
+  for p in _live_providers():
+    hits.extend(d for d in p if _matches(d, id, type, fqname))
+  return hits
 
 
 def list_datasets():
@@ -42,9 +235,15 @@ def get(dataset_id):
   :param dataset_id:
   :return: returns the selected dataset identified by id
   """
+  hit = _get_index().get(dataset_id)
+  if hit is not None:
+    return hit[1]
+  # fall back to asking the providers, e.g. for datasets that were added without firing an event
   for p in _providers():
     r = p[dataset_id]
     if r is not None:
+      if _is_indexed(p):
+        _index.add(p, r)
       return r
   return None
 
@@ -60,6 +259,8 @@ def add(desc, files=[], id=None):
   for p in _providers():
     r = p.upload(desc, files, id)
     if r:
+      if _is_indexed(p):
+        _get_index().add(p, r)
       return r
   return None
 
@@ -76,6 +277,27 @@ def update(dataset, desc, files=[]):
   if old is None:
     return add(desc, files)
   r = old.update(desc, files)
+  if r:
+    _invalidate_description(old)
+    _index.update(old)
+  return r
+
+
+def modify(dataset, desc, files=[]):
+  """
+  modifies the given dataset
+  :param dataset: a dataset or a dataset id
+  :param desc: the dict description information
+  :param files: a list of FileStorage
+  :return: boolean whether the operation was successful
+  """
+  old = get(dataset) if isinstance(dataset, str) else dataset
+  if old is None:
+    return False
+  r = old.modify(desc, files)
+  if r:
+    _invalidate_description(old)
+    _index.update(old)
   return r
 
 
@@ -90,21 +312,49 @@ def remove(dataset):
     return False
   for p in _providers():
     if p.remove(old):
+      _invalidate_description(old)
+      _index.remove(old)
       return True
   return False
 
 
 def list_idtypes():
-  tmp = dict()
-  for d in list_datasets():
-    for idtype in d.to_idtype_descriptions():
-      tmp[idtype['id']] = idtype
+  key = _idtype_catalog_key()
+  live = _live_providers()
+  global _idtype_catalog
+  if not live and _idtype_catalog is not None and _idtype_catalog[0] == key:
+    return list(_idtype_catalog[1])
 
+  tmp = OrderedDict((desc['id'], desc) for desc in _get_index().idtypes())
+  for p in live:
+    for d in p:
+      for desc in d.to_idtype_descriptions():
+        tmp[desc['id']] = desc
   # also include the known elements from the mapping graph
-  mapping = get_mappingmanager()
-  for idtype_id in mapping.known_idtypes():
+  for idtype_id in key[2]:
     tmp[idtype_id] = to_idtype_description(idtype_id)
-  return list(tmp.values())
+  catalog = list(tmp.values())
+  if not live:
+    _idtype_catalog = (key, catalog)
+  return list(catalog)
+
+
+def _idtype_catalog_key():
+  index = _get_index()
+  mapping = get_mappingmanager()
+  return id(index), index.idtype_version, tuple(sorted(mapping.known_idtypes()))
+
+
+def list_idtypes_version():
+  """
+  :return: a version string of the idtype catalog that changes whenever the result of list_idtypes changes or None if
+  it depends on providers iterated live
+  """
+  import zlib
+  if _live_providers():
+    return None
+  _, version, known = _idtype_catalog_key()
+  return '{}-{}-{:x}'.format(_process_token, version, zlib.crc32('\n'.join(known).encode('utf-8')))
 
 
 def get_mappingmanager():
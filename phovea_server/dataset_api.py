@@ -8,8 +8,10 @@
 from builtins import str
 from . import ns, plugin
 from .util import jsonify, to_json
+from .security import filter_readable
 import logging
-from .dataset import list_idtypes, iter, get_mappingmanager, get, list_datasets, add, remove
+from .dataset import list_idtypes, list_idtypes_version, iter, count, find, get_mappingmanager, get, list_datasets, add, update, modify, remove
+import itertools
 
 
 app = ns.Namespace(__name__)
@@ -38,7 +40,8 @@ def _list_format_treejson(data):
       if level not in act:
         act[level] = dict()
       act = act[level]
-    act[d['name']] = d
+    # a copy, since the descriptions are shared and the tree adds child levels to the entries
+    act[d['name']] = dict(d)
   return jsonify(r, indent=1)
 
 
@@ -62,16 +65,40 @@ def _list_format_csv(data):
   return ns.Response(gen(), mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=dataset.csv'})
 
 
+_QUERY_KEYS = ['name', 'id', 'fqname', 'type']
+# keys whose literal prefixes are backed by the dataset index
+_INDEXED_KEYS = ['id', 'fqname', 'type']
+_REGEX_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+
 def _to_query(query):
-  keys = ['name', 'id', 'fqname', 'type']
-  act_query = {k: v for k, v in query.items() if k in keys}
-  if len(act_query) == 0:  # no query
-    return lambda x: True
+  """
+  compiles the filter of the dataset listing once per request. A pattern without special characters is a plain prefix
+  test for re.match, such that it is checked via startswith and looked up in the dataset index
+  :param query: the request values
+  :return: filter function with the attributes is_empty and prefixes, the literal prefixes of the indexed keys
+  """
   import re
+  checks = []
+  prefixes = {}
+  for k, v in query.items():
+    if k not in _QUERY_KEYS:
+      continue
+    if _REGEX_CHARS.isdisjoint(v):
+      if k in _INDEXED_KEYS:
+        prefixes[k] = v
+      checks.append((k, lambda value, prefix=v: value.startswith(prefix)))
+    else:
+      try:
+        checks.append((k, re.compile(v).match))
+      except re.error:
+        ns.abort(400, 'invalid pattern for "{0}": "{1}"'.format(k, v))
 
   def filter_elem(elem):
-    return all((re.match(v, getattr(elem, k, '')) for k, v in act_query.items()))
+    return all(check(getattr(elem, k, '')) for k, check in checks)
 
+  filter_elem.is_empty = len(checks) == 0
+  filter_elem.prefixes = prefixes
   return filter_elem
 
 
@@ -79,23 +106,75 @@ def _to_query(query):
 @ns.etag
 def _list_datasets():
   if ns.request.method == 'GET':
-    query = _to_query(ns.request.values)
-    data = [d.to_description() for d in iter() if query(d)]
-
-    limit = ns.request.values.get('limit', -1)
-    if 0 < limit < len(data):
-      data = data[:limit]
-
     format = ns.request.args.get('format', 'json')
     formats = dict(json=_list_format_json, treejson=_list_format_treejson, csv=_list_format_csv)
     if format not in formats:
       ns.abort(
           ns.make_response('invalid format: "{0}" possible ones: {1}'.format(format, ','.join(list(formats.keys()))), 400))
-    return formats[format](data)
+
+    values = ns.request.values
+    query = _to_query(values)
+    limit = _to_int(values.get('limit'), -1)
+    offset = _decode_cursor(values['cursor']) if 'cursor' in values else max(0, _to_int(values.get('offset'), 0))
+    paginated = limit > 0 or offset > 0 or 'cursor' in values
+
+    candidates = find(**query.prefixes) if query.prefixes else None
+    entries = (d for d in (iter() if candidates is None else candidates) if query(d))
+    hide_unreadable = _hide_unreadable()
+    if hide_unreadable:
+      # the entries up to the end of the page are described once for both the permission check and the response
+      entries = filter_readable(d.description() for d in entries)
+    if offset > 0:
+      entries = itertools.islice(entries, offset, None)
+    # one more entry is fetched to know whether there is a next page
+    page = list(itertools.islice(entries, limit + 1) if limit > 0 else entries)
+    has_next = 0 < limit < len(page)
+    if has_next:
+      page = page[:limit]
+    # generate the descriptions lazily, only for the entries of the requested page
+    data = page if hide_unreadable else [d.description() for d in page]
+
+    r = formats[format](data)
+    if paginated:
+      # the number of matching entries, an upper bound of the readable ones if unreadable entries are hidden
+      total = count() if query.is_empty else sum(1 for d in (iter() if candidates is None else candidates) if query(d))
+      r.headers['X-Total-Count'] = str(max(total, offset + len(data)))
+      if has_next:
+        r.headers['X-Next-Cursor'] = _encode_cursor(offset + len(data))
+    return r
   else:
     return _upload_dataset(ns.request)
 
 
+def _hide_unreadable():
+  from .config import view
+  return view('phovea_server.dataset').getboolean('hide_unreadable', default=False)
+
+
+def _to_int(value, default):
+  try:
+    return int(value) if value is not None else default
+  except ValueError:
+    ns.abort(400, 'invalid number: "{0}"'.format(value))
+
+
+def _encode_cursor(offset):
+  import base64
+  return base64.urlsafe_b64encode('o:{0}'.format(offset).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+  import base64
+  import binascii
+  try:
+    kind, offset = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(':', 1)
+    if kind == 'o' and int(offset) >= 0:
+      return int(offset)
+  except (ValueError, binascii.Error):
+    pass
+  ns.abort(400, 'invalid cursor: "{0}"'.format(cursor))
+
+
 @app.route('/<dataset_id>', methods=['PUT', 'GET', 'DELETE', 'POST'])
 @ns.etag
 def _get_dataset(dataset_id):
@@ -121,7 +200,7 @@ def _get_dataset_desc(dataset_id):
     return 'invalid dataset id "' + str(dataset_id) + '"', 404
   if not d.can_read():
     return 'not allowed', 403
-  return jsonify(d.to_description())
+  return jsonify(d.description())
 
 
 def _dataset_getter(dataset_id, dataset_type):
@@ -149,7 +228,7 @@ def _upload_dataset(request, id=None):
     # first choose the provider to handle the upload
     r = add(_to_upload_desc(request.values), request.files, id)
     if r:
-      return jsonify(r.to_description(), indent=1)
+      return jsonify(r.description(), indent=1)
     # invalid upload
     return 'invalid upload', 400
   except ValueError as e:
@@ -163,9 +242,9 @@ def _update_dataset(dataset_id, request):
       return _upload_dataset(request, dataset_id)
     if not old.can_write():
       return 'not allowed', 403
-    r = old.update(_to_upload_desc(request.values), request.files)
+    r = update(old, _to_upload_desc(request.values), request.files)
     if r:
-      return jsonify(old.to_description(), indent=1)
+      return jsonify(old.description(), indent=1)
     # invalid upload
     return 'invalid upload', 400
   except ValueError as e:
@@ -179,9 +258,9 @@ def _modify_dataset(dataset_id, request):
       return 'invalid dataset id "' + str(dataset_id) + '"', 404
     if not old.can_write():
       return 'not allowed', 403
-    r = old.modify(_to_upload_desc(request.values), request.files)
+    r = modify(old, _to_upload_desc(request.values), request.files)
     if r:
-      return jsonify(old.to_description(), indent=1)
+      return jsonify(old.description(), indent=1)
       # invalid upload
     return 'invalid upload', 400
   except ValueError as e:
@@ -206,7 +285,7 @@ def create_dataset():
 
 
 @app_idtype.route('/')
-@ns.etag
+@ns.etag_version(lambda: list_idtypes_version())
 def _list_idtypes():
   return jsonify(list_idtypes())
 
@@ -247,12 +326,58 @@ def _do_mapping(idtype, to_idtype):
     ns.abort(400)
     return
 
-  mapped_list = mapper(idtype, to_idtype, names)
+  format = args.get('format', 'json')
+  if format not in ['json', 'ndjson']:
+    ns.abort(400, 'invalid format: "{0}" possible ones: json,ndjson'.format(format))
 
-  if first_only:
-    mapped_list = [None if a is None or len(a) == 0 else a[0] for a in mapped_list]
+  def to_result(mapped_list):
+    if first_only:
+      return [None if a is None or len(a) == 0 else a[0] for a in mapped_list]
+    return mapped_list
 
-  return jsonify(mapped_list)
+  if format == 'ndjson' or args.get('stream', 'false').lower() in ['true', '1']:
+    response = _stream_mapping(mapper, idtype, to_idtype, names, to_result, format)
+  else:
+    response = jsonify(to_result(mapper(idtype, to_idtype, names)))
+
+  # report the chosen mapping path
+  path = mapper.path(idtype, to_idtype) if hasattr(mapper, 'path') else None
+  if path:
+    response.headers['X-Mapping-Path'] = ','.join(path)
+  return response
+
+
+def _stream_mapping(mapper, idtype, to_idtype, names, to_result, format):
+  """
+  maps the given names in chunks and streams the result as soon as a chunk is mapped
+  such that neither the whole result nor its json representation have to be kept in memory
+  """
+  from .config import view
+  chunk_size = max(1, view('phovea_server.mapping').getint('stream_chunk_size', default=1000))
+
+  def chunks():
+    for i in range(0, len(names), chunk_size):
+      yield to_result(mapper(idtype, to_idtype, names[i:i + chunk_size]))
+
+  def gen_json():
+    yield '['
+    first = True
+    for chunk in chunks():
+      if not chunk:
+        continue
+      # strip the array brackets, such that the result is the same as encoding the whole list at once
+      yield ('' if first else ', ') + to_json(chunk)[1:-1]
+      first = False
+    yield ']'
+
+  def gen_ndjson():
+    for chunk in chunks():
+      for entry in chunk:
+        yield to_json(entry) + '\n'
+
+  if format == 'ndjson':
+    return ns.Response(ns.stream_with_context(gen_ndjson()), mimetype='application/x-ndjson; charset=utf-8')
+  return ns.Response(ns.stream_with_context(gen_json()), mimetype='application/json; charset=utf-8')
 
 
 # add all specific handler
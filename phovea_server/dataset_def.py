@@ -6,6 +6,10 @@
 
 from builtins import object
 import abc
+import itertools
+
+# process wide source of description versions, such that a version is never used by two entries or states
+_versions = itertools.count(1)
 
 
 def to_plural(s):
@@ -23,6 +27,10 @@ class ADataSetEntry(object, metaclass=abc.ABCMeta):
   A basic dataset entry
   """
 
+  # whether this entry only changes via its own methods, the registry operations or the change events of its provider
+  # within this process, such that its description can be memoized. Not e.g. for entries read from a shared database
+  local_changes = False
+
   def __init__(self, name, project, type, id=None):
     """
     constructor for a new dataset
@@ -36,6 +44,7 @@ class ADataSetEntry(object, metaclass=abc.ABCMeta):
     self.type = type
     from .util import fix_id
     self.id = id if id is not None else fix_id(self.fqname)
+    self._description_version = next(_versions)
 
   def idtypes(self):
     """
@@ -52,6 +61,36 @@ class ADataSetEntry(object, metaclass=abc.ABCMeta):
                 id=self.id,
                 fqname=self.fqname)
 
+  def description(self):
+    """
+    memoized version of `to_description` for entries with local_changes, recomputed after `invalidate_description`
+    was called
+    :return: the shared description dictionary, which must not be modified
+    """
+    if not self.local_changes:
+      return self.to_description()
+    version = self.description_version
+    cached = self.__dict__.get('_description')
+    if cached is None or cached[0] != version:
+      cached = self._description = (version, self.to_description())
+    return cached[1]
+
+  @property
+  def description_version(self):
+    """
+    :return: version stamp of the description, unique within this process and renewed whenever it is invalidated
+    """
+    version = self.__dict__.get('_description_version')
+    if version is None:
+      version = self._description_version = next(_versions)
+    return version
+
+  def invalidate_description(self):
+    """
+    marks the memoized description as outdated, e.g. after this dataset has been changed
+    """
+    self._description_version = next(_versions)
+
   def to_idtype_descriptions(self):
     """
     list of a all idtypes of this dataset
@@ -95,14 +134,48 @@ class ADataSetEntry(object, metaclass=abc.ABCMeta):
 
   def can_read(self, user=None):
     from .security import can_read
-    return can_read(self.to_description(), user)
+    return can_read(self.description(), user)
 
   def can_write(self, user=None):
     from .security import can_write
-    return can_write(self.to_description(), user)
+    return can_write(self.description(), user)
 
 
 class ADataSetProvider(object, metaclass=abc.ABCMeta):
+  """
+  A provider of datasets. By default the datasets of a provider are iterated live on every access. Providers can opt
+  into the dataset index of the registry, either by declaring themselves static or by firing change events for all
+  changes done outside of the registry operations (add, update, remove).
+  """
+
+  # whether the datasets of this provider only change via the registry operations
+  static = False
+  # whether this provider fires change events for every change done outside of the registry operations
+  fires_change_events = False
+
+  def add_change_listener(self, listener):
+    """
+    registers a listener called with (provider, event, entry) whenever a dataset of this provider changes
+    :param listener: the listener function
+    """
+    if '_change_listeners' not in self.__dict__:
+      self._change_listeners = []
+    self._change_listeners.append(listener)
+
+  def remove_change_listener(self, listener):
+    listeners = self.__dict__.get('_change_listeners', [])
+    if listener in listeners:
+      listeners.remove(listener)
+
+  def fire_change(self, event, entry=None):
+    """
+    notifies the listeners about a changed dataset
+    :param event: one of 'add', 'update', 'remove' or 'reset' if the whole provider changed
+    :param entry: the changed dataset entry, None for a reset
+    """
+    for listener in list(self.__dict__.get('_change_listeners', [])):
+      listener(self, event, entry)
+
   def __len__(self):
     import itertools
     return itertools.count(self)
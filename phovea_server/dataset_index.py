@@ -0,0 +1,261 @@
+###############################################################################
+# Caleydo - Visualization for Molecular Biology - http://caleydo.org
+# Copyright (c) The Caleydo Team. All rights reserved.
+# Licensed under the new BSD license, available at http://caleydo.org/license
+###############################################################################
+
+
+from builtins import object
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import threading
+import logging
+
+_log = logging.getLogger(__name__)
+
+
+class DataSetIndex(object):
+  """
+  in-memory index of all datasets of the registered dataset providers, mapping a dataset id to its provider and entry.
+  The index is filled by scanning a provider once and is kept up to date by the registry operations and by the change
+  events the providers can fire.
+  """
+
+  def __init__(self):
+    self._lock = threading.RLock()
+    # dataset id -> (provider, entry) in the iteration order of the providers
+    self._entries = OrderedDict()
+    # id(provider) -> set of dataset ids of the provider
+    self._provider_ids = {}
+    # incremented on every change of the index
+    self.version = 0
+    # idtype id -> [number of datasets using it, idtype description] in the order of their first occurrence
+    self._idtypes = OrderedDict()
+    # dataset id -> list of idtype descriptions of the dataset
+    self._entry_idtypes = {}
+    # incremented on every change of the idtype catalog
+    self.idtype_version = 0
+    # secondary indices for filtering by literal id, type and fqname prefixes
+    # dataset id -> sequence number reflecting the iteration order
+    self._seq = {}
+    self._next_seq = 0
+    # dataset id -> (type, fqname) as they have been indexed
+    self._keys = {}
+    # type -> set of dataset ids
+    self._by_type = {}
+    # sorted lists of (fqname, dataset id) and (dataset id, dataset id) for prefix lookups
+    self._fqnames = []
+    self._ids = []
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __iter__(self):
+    """
+    iterates over all indexed entries in the iteration order of the providers
+    """
+    with self._lock:
+      entries = [entry for _, entry in self._entries.values()]
+    return iter(entries)
+
+  def __contains__(self, dataset_id):
+    return dataset_id in self._entries
+
+  def idtypes(self):
+    """
+    :return: list of the idtype descriptions of all indexed datasets
+    """
+    with self._lock:
+      return [desc for _, desc in self._idtypes.values()]
+
+  def has_provider(self, provider):
+    return id(provider) in self._provider_ids
+
+  def add_provider(self, provider):
+    """
+    indexes all datasets of the given provider
+    """
+    entries = list(provider)
+    with self._lock:
+      self._provider_ids[id(provider)] = set()
+      for entry in entries:
+        self._add(provider, entry)
+      self.version += 1
+
+  def remove_provider(self, provider):
+    with self._lock:
+      for dataset_id in self._provider_ids.pop(id(provider), set()):
+        self._remove(dataset_id)
+      self.version += 1
+
+  def reset_provider(self, provider):
+    """
+    rescans the given provider, e.g. after it changed its datasets in bulk
+    """
+    with self._lock:
+      self.remove_provider(provider)
+      self.add_provider(provider)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._provider_ids.clear()
+      self._idtypes.clear()
+      self._entry_idtypes.clear()
+      self._seq.clear()
+      self._keys.clear()
+      self._by_type.clear()
+      del self._fqnames[:]
+      del self._ids[:]
+      self.version += 1
+      self.idtype_version += 1
+
+  def get(self, dataset_id):
+    """
+    :return: the tuple (provider, entry) of the given dataset id or None if it is not indexed
+    """
+    return self._entries.get(dataset_id)
+
+  def find(self, id=None, type=None, fqname=None):
+    """
+    looks up the entries matching all the given prefixes using the secondary indices
+    :param id: optional dataset id prefix
+    :param type: optional dataset type prefix
+    :param fqname: optional fqname prefix
+    :return: list of matching entries in iteration order or None if no prefix was given
+    """
+    with self._lock:
+      hits = []
+      if type is not None:
+        hits.append(set().union(*[ids for t, ids in self._by_type.items() if t.startswith(type)]))
+      if fqname is not None:
+        hits.append(_prefix_range(self._fqnames, fqname))
+      if id is not None:
+        hits.append(_prefix_range(self._ids, id))
+      if not hits:
+        return None
+      hits.sort(key=len)
+      matches = hits[0].intersection(*hits[1:])
+      return [self._entries[k][1] for k in sorted(matches, key=self._seq.__getitem__)]
+
+  def add(self, provider, entry):
+    """
+    adds or replaces the given entry of the given provider
+    """
+    with self._lock:
+      self._add(provider, entry)
+      self.version += 1
+
+  def update(self, entry):
+    """
+    reindexes the given entry after it has been changed
+    """
+    with self._lock:
+      key = self._find_key(entry)
+      if key is None:
+        return
+      provider = self._entries[key][0]
+      if key != entry.id:
+        self._remove(key)
+      self._add(provider, entry)
+      self.version += 1
+
+  def remove(self, entry):
+    with self._lock:
+      key = self._find_key(entry)
+      if key is not None:
+        self._remove(key)
+        self.version += 1
+
+  def _find_key(self, entry):
+    hit = self._entries.get(entry.id)
+    if hit is not None and hit[1] is entry:
+      return entry.id
+    # the id of the entry has been changed
+    return next((k for k, (_, e) in self._entries.items() if e is entry), None)
+
+  def _add(self, provider, entry):
+    old = self._entries.get(entry.id)
+    if old is not None and old[0] is not provider:
+      self._remove(entry.id)
+    elif old is not None:
+      self._remove_idtypes(entry.id)
+      self._remove_keys(entry.id)
+    # replacing an existing key keeps its position
+    self._entries[entry.id] = (provider, entry)
+    if entry.id not in self._seq:
+      self._seq[entry.id] = self._next_seq
+      self._next_seq += 1
+    self._provider_ids.setdefault(id(provider), set()).add(entry.id)
+    self._add_idtypes(entry)
+    self._add_keys(entry)
+
+  def _remove(self, dataset_id):
+    provider, entry = self._entries.pop(dataset_id)
+    self._provider_ids.get(id(provider), set()).discard(dataset_id)
+    self._remove_idtypes(dataset_id)
+    self._remove_keys(dataset_id)
+    del self._seq[dataset_id]
+    return entry
+
+  def _add_keys(self, entry):
+    type, fqname = str(getattr(entry, 'type', '')), str(getattr(entry, 'fqname', ''))
+    self._keys[entry.id] = (type, fqname)
+    self._by_type.setdefault(type, set()).add(entry.id)
+    insort(self._fqnames, (fqname, entry.id))
+    insort(self._ids, (entry.id, entry.id))
+
+  def _remove_keys(self, dataset_id):
+    keys = self._keys.pop(dataset_id, None)
+    if keys is None:
+      return
+    type, fqname = keys
+    ids = self._by_type.get(type)
+    if ids is not None:
+      ids.discard(dataset_id)
+      if not ids:
+        del self._by_type[type]
+    _remove_sorted(self._fqnames, (fqname, dataset_id))
+    _remove_sorted(self._ids, (dataset_id, dataset_id))
+
+  def _add_idtypes(self, entry):
+    descs = entry.to_idtype_descriptions()
+    self._entry_idtypes[entry.id] = descs
+    for desc in descs:
+      act = self._idtypes.get(desc['id'])
+      if act is None:
+        self._idtypes[desc['id']] = [1, desc]
+        self.idtype_version += 1
+      else:
+        act[0] += 1
+        if act[1] != desc:
+          act[1] = desc
+          self.idtype_version += 1
+
+  def _remove_idtypes(self, dataset_id):
+    for desc in self._entry_idtypes.pop(dataset_id, []):
+      act = self._idtypes.get(desc['id'])
+      if act is None:
+        continue
+      act[0] -= 1
+      if act[0] <= 0:
+        del self._idtypes[desc['id']]
+        self.idtype_version += 1
+
+
+def _prefix_range(keys, prefix):
+  """
+  :return: set of the dataset ids of the sorted (key, dataset id) list whose key starts with the given prefix
+  """
+  i = bisect_left(keys, (prefix,))
+  ids = set()
+  while i < len(keys) and keys[i][0].startswith(prefix):
+    ids.add(keys[i][1])
+    i += 1
+  return ids
+
+
+def _remove_sorted(keys, key):
+  i = bisect_left(keys, key)
+  if i < len(keys) and keys[i] == key:
+    del keys[i]
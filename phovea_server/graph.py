@@ -7,7 +7,12 @@
 
 from builtins import object
 from .dataset_def import ADataSetEntry
+from collections import OrderedDict
+import itertools
 import abc
+import logging
+
+_log = logging.getLogger(__name__)
 
 
 class GraphNode(object):
@@ -36,18 +41,161 @@ class GraphEdge(object):
                 attrs=self.attrs)
 
 
+class GraphIndex(object):
+  """
+  id -> node and id -> edge maps of a graph together with the incoming and outgoing edges of each node
+  """
+
+  def __init__(self, nodes=(), edges=()):
+    self.nodes = {}
+    self.edges = {}
+    # node id -> {edge id: edge}
+    self._incoming = {}
+    self._outgoing = {}
+    for n in nodes:
+      self.add_node(n)
+    for e in edges:
+      self.add_edge(e)
+
+  def add_node(self, node):
+    self.nodes[node.id] = node
+
+  def remove_node(self, id):
+    """
+    removes the given node together with its incoming and outgoing edges
+    :return: tuple of the removed node (None if unknown) and the list of removed edges
+    """
+    node = self.nodes.pop(id, None)
+    # self loops are both incoming and outgoing edges
+    edges = list({**self._incoming.get(id, {}), **self._outgoing.get(id, {})}.values())
+    for e in edges:
+      self.remove_edge(e.id)
+    self._incoming.pop(id, None)
+    self._outgoing.pop(id, None)
+    return node, edges
+
+  def add_edge(self, edge):
+    self.edges[edge.id] = edge
+    self._outgoing.setdefault(edge.source, {})[edge.id] = edge
+    self._incoming.setdefault(edge.target, {})[edge.id] = edge
+
+  def update_edge(self, edge, source, target):
+    """
+    moves the given edge to the new source and target nodes
+    """
+    self._outgoing.get(edge.source, {}).pop(edge.id, None)
+    self._incoming.get(edge.target, {}).pop(edge.id, None)
+    edge.source = source
+    edge.target = target
+    self._outgoing.setdefault(source, {})[edge.id] = edge
+    self._incoming.setdefault(target, {})[edge.id] = edge
+
+  def remove_edge(self, id):
+    """
+    :return: the removed edge or None if unknown
+    """
+    edge = self.edges.pop(id, None)
+    if edge is not None:
+      self._outgoing.get(edge.source, {}).pop(id, None)
+      self._incoming.get(edge.target, {}).pop(id, None)
+    return edge
+
+  def incoming(self, node_id):
+    return list(self._incoming.get(node_id, {}).values())
+
+  def outgoing(self, node_id):
+    return list(self._outgoing.get(node_id, {}).values())
+
+  def clear(self):
+    self.nodes.clear()
+    self.edges.clear()
+    self._incoming.clear()
+    self._outgoing.clear()
+
+
+_BATCH_OPS = ('add', 'update', 'remove')
+
+# changes of the (node, edge) counters by the mutating graph methods, None marks the edges removed together with a
+# node, which are reported via AGraph.report_removed_edges
+_SIZE_CHANGES = dict(add_node=(1, 0), remove_node=(-1, None), add_edge=(0, 1), remove_edge=(0, -1),
+                     update_node=(0, 0), update_edge=(0, 0))
+
+
+def _batch_size_changes(operations, results):
+  """
+  :return: tuple (nodes, edges, whether nodes were removed) of the changes of the counters by the successful
+  operations of a batch, not including the edges removed together with nodes
+  """
+  dnodes, dedges, removes_nodes = 0, 0, False
+  for o, status in zip(operations, results or []):
+    if status != 'ok' or not isinstance(o, dict):
+      continue
+    change = _SIZE_CHANGES.get('{0}_{1}'.format(o.get('op'), o.get('type')))
+    if change is None:
+      continue
+    dnodes += change[0]
+    dedges += change[1] or 0
+    removes_nodes = removes_nodes or change[1] is None
+  return dnodes, dedges, removes_nodes
+
+
+def _track_changes(name, f):
+  """
+  wraps a mutating method of a graph such that a successful call maintains the size counters and
+  invalidates the memoized description. Nested calls, e.g. via super(), are only tracked once.
+  """
+  import functools
+
+  @functools.wraps(f)
+  def wrapper(self, *args, **kwargs):
+    depth = self.__dict__.get('_mutation_depth', 0)
+    if depth == 0:
+      self.__dict__.pop('_removed_edges', None)
+    self._mutation_depth = depth + 1
+    try:
+      r = f(self, *args, **kwargs)
+    finally:
+      self._mutation_depth = depth
+    if r and depth == 0:
+      self._apply_change(name, args, r)
+    return r
+
+  wrapper.tracks_changes = True
+  return wrapper
+
+
 class AGraph(ADataSetEntry, metaclass=abc.ABCMeta):
+  # cached number of nodes and edges, None if not yet counted
+  _nnodes = None
+  _nedges = None
+  # whether node and edge lookups use a GraphIndex built from nodes() and edges(), which is dropped after changes
+  use_index = False
+  # whether the subclass keeps its graph_index up to date itself
+  maintains_index = False
+
   def __init__(self, name, project, id=None, attrs=None):
     super(AGraph, self).__init__(name, project, 'graph', id)
     self.attrs = {} if attrs is None else attrs
 
+  def __init_subclass__(cls, **kwargs):
+    super(AGraph, cls).__init_subclass__(**kwargs)
+    for name in list(_SIZE_CHANGES.keys()) + ['clear', 'apply_batch']:
+      f = cls.__dict__.get(name)
+      if f is not None and not getattr(f, 'tracks_changes', False):
+        setattr(cls, name, _track_changes(name, f))
+
   @abc.abstractmethod
   def nodes(self):
     return []
 
   @property
   def nnodes(self):
-    return len(self.nodes())
+    # the counters are only maintained for graphs with local_changes, others might be changed by someone else
+    if not self.local_changes:
+      return len(self.nodes())
+    if self._nnodes is None:
+      self._nnodes = len(self.nodes())
+    return self._nnodes
 
   @abc.abstractmethod
   def edges(self):
@@ -55,7 +203,54 @@ class AGraph(ADataSetEntry, metaclass=abc.ABCMeta):
 
   @property
   def nedges(self):
-    return len(self.edges())
+    if not self.local_changes:
+      return len(self.edges())
+    if self._nedges is None:
+      self._nedges = len(self.edges())
+    return self._nedges
+
+  def _apply_change(self, name, args=(), result=None):
+    if name == 'clear':
+      self._nnodes = self._nedges = 0
+    else:
+      if name == 'apply_batch':
+        # a custom batch implementation, the changes are derived from the successful operations
+        dnodes, dedges, removes_nodes = _batch_size_changes(args[0] if args else [], result)
+      else:
+        dnodes, dedges = _SIZE_CHANGES[name]
+        removes_nodes = dedges is None
+        dedges = dedges or 0
+      if removes_nodes:
+        # removing a node might remove its edges, too, which are counted again if the subclass does not report them
+        removed = self.__dict__.pop('_removed_edges', None)
+        dedges = None if removed is None else dedges - removed
+      if self._nnodes is not None:
+        self._nnodes += dnodes
+      self._nedges = None if dedges is None or self._nedges is None else self._nedges + dedges
+    if not self.maintains_index:
+      self.__dict__.pop('_graph_index', None)
+    super(AGraph, self).invalidate_description()
+
+  def invalidate_description(self):
+    """
+    invalidates the memoized description and the size counters, which are counted again on the next access
+    """
+    self._nnodes = self._nedges = None
+    if not self.maintains_index:
+      self.__dict__.pop('_graph_index', None)
+    super(AGraph, self).invalidate_description()
+
+  @property
+  def graph_index(self):
+    """
+    :return: the GraphIndex of this graph if the subclass opted in via use_index else None
+    """
+    if not self.use_index:
+      return None
+    index = self.__dict__.get('_graph_index')
+    if index is None:
+      index = self._graph_index = GraphIndex(self.nodes(), self.edges())
+    return index
 
   def to_description(self):
     r = super(AGraph, self).to_description()
@@ -70,6 +265,20 @@ class AGraph(ADataSetEntry, metaclass=abc.ABCMeta):
     r = dict(nodes=nodes, edges=edges)
     return r
 
+  def iter_json(self, name, chunk_size=1000):
+    """
+    generates the json representations of the nodes or edges in chunks, such that they can be streamed
+    :param name: either 'nodes' or 'edges'
+    :param chunk_size: the number of items per chunk
+    :return: generator of lists of json dicts
+    """
+    items = iter(getattr(self, name)())
+    while True:
+      chunk = [i.asjson() for i in itertools.islice(items, chunk_size)]
+      if not chunk:
+        return
+      yield chunk
+
   def add_node(self, data):
     return False
 
@@ -77,15 +286,34 @@ class AGraph(ADataSetEntry, metaclass=abc.ABCMeta):
     return False
 
   def get_node(self, id):
+    index = self.graph_index
+    if index is not None:
+      return index.nodes.get(id)
     return next((n for n in self.nodes() if n.id == id), None)
 
   def remove_node(self, id):
+    """
+    removes the given node and its edges. Implementations should call report_removed_edges with the number of
+    removed edges, otherwise the edges are counted again. The same applies to node removals of custom apply_batch
+    implementations
+    :return: boolean whether the node was removed
+    """
     return False
 
+  def report_removed_edges(self, count):
+    """
+    reports the number of edges removed together with a node within remove_node, such that the edge counter can be
+    updated without counting all edges again
+    """
+    self._removed_edges = self.__dict__.get('_removed_edges', 0) + count
+
   def add_edge(self, data):
     return False
 
   def get_edge(self, id):
+    index = self.graph_index
+    if index is not None:
+      return index.edges.get(id)
     return next((n for n in self.edges() if n.id == id), None)
 
   def update_edge(self, data):
@@ -97,13 +325,165 @@ class AGraph(ADataSetEntry, metaclass=abc.ABCMeta):
   def clear(self):
     return False
 
+  def apply_batch(self, operations):
+    """
+    applies a list of operations one after the other. Subclasses can override it to apply them as a single transaction
+    :param operations: list of dicts with the keys op ('add', 'update' or 'remove'), type ('node' or 'edge') and
+    data, the description of the item. Removals can also just specify the id of the item
+    :return: list with a status per operation: 'ok', 'failed' if it was rejected, 'invalid' or 'error'
+    """
+    results = []
+    for o in operations:
+      if not isinstance(o, dict) or o.get('op') not in _BATCH_OPS or o.get('type') not in ('node', 'edge'):
+        results.append('invalid')
+        continue
+      data = o.get('data') or {}
+      arg = o.get('id', data.get('id') if isinstance(data, dict) else data) if o['op'] == 'remove' else data
+      if arg is None or (o['op'] != 'remove' and not isinstance(arg, dict)):
+        results.append('invalid')
+        continue
+      try:
+        ok = getattr(self, o['op'] + '_' + o['type'])(arg)
+        results.append('ok' if ok else 'failed')
+      except Exception:
+        _log.exception('error applying %s of %s', o['op'], o['type'])
+        results.append('error')
+    return results
+
+  def load_batches(self, batches):
+    """
+    adds the nodes and edges given in batches via apply_batch, such that a large upload is never held in memory as a
+    whole, see parse_batches. Nodes have to be given before the edges connecting them
+    :param batches: iterable of (key, value) tuples, the lists of ('nodes', [nodes]) and ('edges', [edges]) are added,
+    an attrs entry is merged into the attributes of the graph and all other entries are ignored
+    :return: dict of the number of operations per status of apply_batch
+    """
+    stats = {}
+    for key, value in batches:
+      if key in ('nodes', 'edges'):
+        for status in self.apply_batch([dict(op='add', type=key[:-1], data=item) for item in value]):
+          stats[status] = stats.get(status, 0) + 1
+      elif key == 'attrs' and isinstance(value, dict):
+        self.attrs.update(value)
+        super(AGraph, self).invalidate_description()
+    return stats
+
   def incoming_edges(self, node):
+    index = self.graph_index
+    if index is not None:
+      return iter(index.incoming(node.id))
     return (e for e in self.edges() if e.target == node.id)
 
   def outgoing_edges(self, node):
+    index = self.graph_index
+    if index is not None:
+      return iter(index.outgoing(node.id))
     return (e for e in self.edges() if e.source == node.id)
 
+  def _adjacent(self, node, direction='both', edge_types=None):
+    """
+    :return: generator of (edge, id of the adjacent node) of the given node following the given direction
+    """
+    if direction in ('out', 'both'):
+      for e in self.outgoing_edges(node):
+        if edge_types is None or e.type in edge_types:
+          yield e, e.target
+    if direction in ('in', 'both'):
+      for e in self.incoming_edges(node):
+        if edge_types is None or e.type in edge_types:
+          yield e, e.source
+
+  def neighborhood(self, node_ids, k=1, direction='both', edge_types=None, max_nodes=None):
+    """
+    collects the nodes within k hops of the given nodes using a bounded breadth first search
+    :param node_ids: the ids of the start nodes
+    :param k: the maximal number of hops
+    :param direction: follow the 'out'going, 'in'coming or 'both' edges
+    :param edge_types: optional set of edge types to follow
+    :param max_nodes: optional maximal number of nodes to collect
+    :return: tuple (nodes, traversed edges, whether the search stopped at max_nodes)
+    """
+    nodes = OrderedDict()
+    for id in node_ids:
+      n = self.get_node(id)
+      if n is not None:
+        nodes[n.id] = n
+    edges = OrderedDict()
+    truncated = False
+    frontier = list(nodes.values())
+    for _ in range(k):
+      next_frontier = []
+      for n in frontier:
+        for e, other in self._adjacent(n, direction, edge_types):
+          if other not in nodes:
+            if max_nodes is not None and len(nodes) >= max_nodes:
+              truncated = True
+              continue
+            o = self.get_node(other)
+            if o is None:
+              continue
+            nodes[other] = o
+            next_frontier.append(o)
+          edges[e.id] = e
+      frontier = next_frontier
+      if not frontier:
+        break
+    return list(nodes.values()), list(edges.values()), truncated
+
+  def subgraph(self, node_ids):
+    """
+    :return: tuple (nodes, edges) of the subgraph induced by the given node ids
+    """
+    nodes = OrderedDict()
+    for id in node_ids:
+      n = self.get_node(id)
+      if n is not None:
+        nodes[n.id] = n
+    edges = [e for n in nodes.values() for e in self.outgoing_edges(n) if e.target in nodes]
+    return list(nodes.values()), edges
+
+  def shortest_path(self, source, target, direction='out', edge_types=None, max_depth=None, max_nodes=None):
+    """
+    finds a path with the minimal number of edges using a breadth first search
+    :param source: the id of the start node
+    :param target: the id of the end node
+    :param direction: follow the 'out'going, 'in'coming or 'both' edges
+    :param edge_types: optional set of edge types to follow
+    :param max_depth: optional maximal number of edges of the path
+    :param max_nodes: optional maximal number of nodes to visit
+    :return: tuple (nodes, edges) of the path or None if there is none within the limits
+    """
+    start = self.get_node(source)
+    if start is None or self.get_node(target) is None:
+      return None
+    # node id -> (edge, previous node)
+    parents = {start.id: None}
+    frontier = [start]
+    depth = 0
+    while frontier and start.id != target and (max_depth is None or depth < max_depth):
+      depth += 1
+      next_frontier = []
+      for n in frontier:
+        for e, other in self._adjacent(n, direction, edge_types):
+          if other in parents:
+            continue
+          if max_nodes is not None and len(parents) >= max_nodes:
+            return None
+          o = self.get_node(other)
+          if o is None:
+            continue
+          parents[other] = (e, n)
+          if other == target:
+            return _to_path(o, parents)
+          next_frontier.append(o)
+      frontier = next_frontier
+    return _to_path(start, parents) if start.id == target else None
+
   def resolve_edges(self, edges):
+    index = self.graph_index
+    if index is not None:
+      n = index.nodes
+      return ((e, n[e.source], n[e.target]) for e in list(edges))
     to_find = set()
     edges = list(edges)
     for e in edges:
@@ -113,6 +493,100 @@ class AGraph(ADataSetEntry, metaclass=abc.ABCMeta):
     return ((e, n[e.source], n[e.target]) for e in edges)
 
 
+class IndexedGraph(AGraph):
+  """
+  in-memory graph storing its nodes and edges in a GraphIndex
+  """
+  use_index = True
+  maintains_index = True
+  local_changes = True
+
+  def __init__(self, name, project, id=None, attrs=None, nodes=(), edges=()):
+    super(IndexedGraph, self).__init__(name, project, id, attrs)
+    self._graph_index = GraphIndex(nodes, edges)
+
+  def nodes(self):
+    return list(self._graph_index.nodes.values())
+
+  def edges(self):
+    return list(self._graph_index.edges.values())
+
+  @property
+  def nnodes(self):
+    return len(self._graph_index.nodes)
+
+  @property
+  def nedges(self):
+    return len(self._graph_index.edges)
+
+  def add_node(self, data):
+    if 'id' not in data or data['id'] in self._graph_index.nodes:
+      return False
+    self._graph_index.add_node(GraphNode(data.get('type', 'node'), data['id'], data.get('attrs')))
+    return True
+
+  def update_node(self, data):
+    n = self._graph_index.nodes.get(data.get('id'))
+    if n is None:
+      return False
+    n.type = data.get('type', n.type)
+    n.attrs = data.get('attrs', n.attrs)
+    return True
+
+  def remove_node(self, id):
+    node, edges = self._graph_index.remove_node(id)
+    self.report_removed_edges(len(edges))
+    return node is not None
+
+  def add_edge(self, data):
+    index = self._graph_index
+    if 'id' not in data or data['id'] in index.edges or \
+       data.get('source') not in index.nodes or data.get('target') not in index.nodes:
+      return False
+    index.add_edge(GraphEdge(data.get('type', 'edge'), data['id'], data['source'], data['target'], data.get('attrs')))
+    return True
+
+  def update_edge(self, data):
+    index = self._graph_index
+    e = index.edges.get(data.get('id'))
+    if e is None:
+      return False
+    source, target = data.get('source', e.source), data.get('target', e.target)
+    if source not in index.nodes or target not in index.nodes:
+      return False
+    e.type = data.get('type', e.type)
+    e.attrs = data.get('attrs', e.attrs)
+    index.update_edge(e, source, target)
+    return True
+
+  def remove_edge(self, id):
+    return self._graph_index.remove_edge(id) is not None
+
+  def clear(self):
+    self._graph_index.clear()
+    return True
+
+
+def _to_path(end, parents):
+  nodes = [end]
+  edges = []
+  act = parents[end.id]
+  while act is not None:
+    e, n = act
+    edges.append(e)
+    nodes.append(n)
+    act = parents[n.id]
+  return nodes[::-1], edges[::-1]
+
+
+def stream_chunk_size():
+  """
+  :return: the maximal number of nodes or edges per chunk when graphs are streamed or parsed in batches
+  """
+  from .config import view
+  return max(1, view('phovea_server.graph').getint('stream_chunk_size', default=1000))
+
+
 def _resolve_parser(format):
   from .plugin import list as list_plugins
   for p in list_plugins('graph-parser'):
@@ -129,7 +603,7 @@ def _guess_format(format_field, files):
     import os.path
     fn = files[0].filename
     name, ext = os.path.splitext(fn)
-    return ext.lower()
+    return ext.lower().lstrip('.')
   return 'json'  # default
 
 
@@ -139,3 +613,31 @@ def parse(args, files):
   if formatter:
     return formatter.factory(args, files)
   return None
+
+
+def _resolve_batch_parser(format):
+  from .plugin import list as list_plugins
+  for p in list_plugins('graph-batch-parser'):
+    if p.format == format:
+      return p.load()
+
+
+def parse_batches(args, files, chunk_size=None):
+  """
+  parses an uploaded graph in batches to be fed into a graph via AGraph.load_batches. Formats with a
+  graph-batch-parser are read incrementally, the result of the graph-parser of all other formats is split into batches
+  :param chunk_size: the maximal number of nodes or edges per batch, by default phovea_server.graph.stream_chunk_size
+  :return: generator of (key, value) tuples: ('nodes', [nodes]), ('edges', [edges]) and the other entries of the
+  graph or None if the format is unknown
+  """
+  if chunk_size is None:
+    chunk_size = stream_chunk_size()
+  format = _guess_format(args.get('format', None), files)
+  parser = _resolve_batch_parser(format)
+  if parser:
+    return parser.factory(args, files, chunk_size)
+  r = parse(args, files)
+  if r is None:
+    return None
+  from .graph_parser import to_batches
+  return to_batches(r, chunk_size)
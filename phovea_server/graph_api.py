@@ -5,9 +5,13 @@
 ###############################################################################
 
 
-from .util import jsonify
+from .util import jsonify, to_json, random_id
+from .graph import stream_chunk_size
 from . import ns
 
+# distinguishes the graph versions of different processes
+_process_token = random_id(8)
+
 
 def _to_desc():
   if 'desc' in ns.request.values:
@@ -18,11 +22,56 @@ def _to_desc():
   return n
 
 
+def _stream_json_list(chunks):
+  """
+  encodes the chunks of a list one after the other, resulting in the same json as encoding the whole list at once
+  """
+  first = True
+  for chunk in chunks:
+    if not chunk:
+      continue
+    yield ('' if first else ', ') + to_json(chunk)[1:-1]
+    first = False
+
+
+def _stream_graph(dataset, chunk_size):
+  yield '{"nodes": ['
+  for c in _stream_json_list(dataset.iter_json('nodes', chunk_size)):
+    yield c
+  yield '], "edges": ['
+  for c in _stream_json_list(dataset.iter_json('edges', chunk_size)):
+    yield c
+  yield ']}'
+
+
 def format_json(dataset, args):
-  d = dataset.asjson()
+  from .graph import AGraph
   if bool(args.get('f_pretty_print', False)):
-    return jsonify(d, indent=' ')
-  return jsonify(d)
+    # pretty printing is done on the whole graph
+    return jsonify(dataset.asjson(), indent=' ')
+  t = type(dataset)
+  if t.asjson is not AGraph.asjson and t.iter_json is AGraph.iter_json:
+    # a custom json representation, which cannot be streamed
+    return jsonify(dataset.asjson())
+  return ns.Response(_stream_graph(dataset, stream_chunk_size()), mimetype='application/json; charset=utf-8')
+
+
+def _graph_version(dataset_getter):
+  """
+  creates a function computing the version based etag of a graph route, changing whenever the graph is changed.
+  Graphs which can change outside of this process have no version, such that the body based etag is used
+  """
+  import zlib
+
+  def version(datasetid):
+    d = dataset_getter(datasetid, 'graph')
+    if not getattr(d, 'local_changes', False):
+      return None
+    args = repr(sorted(ns.request.args.items(multi=True))).encode('utf-8')
+    # the description versions are unique within the process, even across removed and recreated graphs
+    return '{0}-{1:x}-{2:x}'.format(_process_token, d.description_version, zlib.crc32(args))
+
+  return version
 
 
 def resolve_formatter(type, format):
@@ -34,16 +83,126 @@ def resolve_formatter(type, format):
   ns.abort(400, 'unknown format "{0}" possible formats are: {1}'.format(format, formats))
 
 
+def _to_id(v):
+  try:
+    return int(v)
+  except ValueError:
+    return v
+
+
+def _to_list(name):
+  """
+  :return: the list of the comma separated or repeated parameter with the given name or None if not given
+  """
+  values = ns.request.values
+  if name + '[]' in values:
+    return values.getlist(name + '[]')
+  if name in values:
+    return [v for v in values[name].split(',') if v]
+  return None
+
+
+def _to_int(name, default):
+  v = ns.request.values.get(name)
+  try:
+    return default if v is None else int(v)
+  except ValueError:
+    ns.abort(400, 'invalid number for "{0}": "{1}"'.format(name, v))
+
+
+def _to_direction(default):
+  direction = ns.request.values.get('direction', default)
+  if direction not in ('in', 'out', 'both'):
+    ns.abort(400, 'invalid direction "{0}" possible ones: in,out,both'.format(direction))
+  return direction
+
+
+def _to_edge_types():
+  types = _to_list('edge_type')
+  return set(types) if types else None
+
+
+def _max_query_nodes():
+  from .config import view
+  return view('phovea_server.graph').getint('max_query_nodes', default=10000)
+
+
+def _max_stream_size():
+  from .config import view
+  return view('phovea_server.graph').getint('max_stream_size', default=0)
+
+
+class _SizeLimitedStream(object):
+  """
+  wraps a stream aborting the request with 413 as soon as more than max_size bytes have been read
+  """
+
+  def __init__(self, stream, max_size):
+    self._stream = stream
+    self._max_size = max_size
+    self.size = 0
+
+  def read(self, size=-1):
+    block = self._stream.read(size)
+    self.size += len(block)
+    if self.size > self._max_size:
+      ns.abort(413)
+    return block
+
+
+def _create_graph(dataset_getter, datasetid):
+  """
+  creates a new empty graph with the given id described by the query arguments via the dataset providers
+  """
+  from werkzeug.exceptions import NotFound
+  from .dataset import add
+  try:
+    return dataset_getter(datasetid, 'graph')
+  except NotFound:
+    pass
+  desc = {k: v for k, v in ns.request.args.items()}
+  desc['type'] = 'graph'
+  desc.setdefault('name', datasetid)
+  if add(desc, [], datasetid) is None:
+    ns.abort(400, 'cannot create the graph "{0}"'.format(datasetid))
+  return dataset_getter(datasetid, 'graph')
+
+
+def _with_size(d, **kwargs):
+  """
+  adds the size of the graph if it is known without loading the whole graph, i.e. for graphs with local changes
+  """
+  if getattr(d, 'local_changes', False):
+    kwargs['size'] = [d.nnodes, d.nedges]
+  return kwargs
+
+
+def _to_json(nodes, edges, **kwargs):
+  return jsonify(dict(nodes=[n.asjson() for n in nodes], edges=[e.asjson() for e in edges], **kwargs))
+
+
 def _list_items(dataset_getter, name, datasetid):
   d = dataset_getter(datasetid, 'graph')
   if ns.request.method == 'GET':
-    return jsonify([n.asjson() for n in getattr(d, name + 's')()])
+    types = _to_list('type')
+    chunks = d.iter_json(name + 's', stream_chunk_size())
+    if types:
+      types = set(types)
+      chunks = ([n for n in chunk if n['type'] in types] for chunk in chunks)
+
+    def gen():
+      yield '['
+      for c in _stream_json_list(chunks):
+        yield c
+      yield ']'
+
+    return ns.Response(gen(), mimetype='application/json; charset=utf-8')
 
   if ns.request.method == 'DELETE':
     if not d.can_write():
       ns.abort(403)
     if d.clear():
-      return jsonify(d.to_description(), indent=1)
+      return jsonify(d.description(), indent=1)
     ns.abort(400)
 
   # post
@@ -51,7 +210,7 @@ def _list_items(dataset_getter, name, datasetid):
     ns.abort(403)
   n = _to_desc()
   if getattr(d, 'add_' + name)(n):
-    return jsonify(d.to_description(), indent=1)
+    return jsonify(d.description(), indent=1)
   # invalid upload
   ns.abort(400)
 
@@ -66,7 +225,7 @@ def _handle_item(dataset_getter, name, datasetid, itemid):
     if not d.can_write():
       ns.abort(403)
     if getattr(d, 'remove_' + name)(itemid):
-      return jsonify(d.to_description(), indent=1)
+      return jsonify(d.description(), indent=1)
     ns.abort(400)
 
   # put
@@ -75,7 +234,7 @@ def _handle_item(dataset_getter, name, datasetid, itemid):
   n = _to_desc()
   n['id'] = itemid
   if getattr(d, 'update_' + name)(n):
-    return jsonify(d.to_description(), indent=1)
+    return jsonify(d.description(), indent=1)
   # invalid upload
   ns.abort(400)
 
@@ -95,21 +254,96 @@ def add_graph_handler(app, dataset_getter):
   @ns.etag
   def list_graphs(datasetid):
     d = dataset_getter(datasetid, 'graph')
-    return jsonify(d.to_description())
+    return jsonify(d.description())
 
   @app.route('/graph/<datasetid>/data')
-  @ns.etag
+  @ns.etag_version(_graph_version(dataset_getter))
   def get_graph_data(datasetid):
     d = dataset_getter(datasetid, 'graph')
     formatter = resolve_formatter('graph', ns.request.args.get('format', 'json'))
     return formatter(d, args=ns.request.args)
 
+  @app.route('/graph/<datasetid>/neighborhood')
+  @ns.etag
+  def get_neighborhood(datasetid):
+    d = dataset_getter(datasetid, 'graph')
+    node_ids = _to_list('node')
+    if not node_ids:
+      ns.abort(400, 'missing parameter "node"')
+    max_nodes = min(_to_int('max_nodes', _max_query_nodes()), _max_query_nodes())
+    nodes, edges, truncated = d.neighborhood([_to_id(n) for n in node_ids], k=max(0, _to_int('k', 1)),
+                                             direction=_to_direction('both'), edge_types=_to_edge_types(),
+                                             max_nodes=max_nodes)
+    return _to_json(nodes, edges, truncated=truncated)
+
+  @app.route('/graph/<datasetid>/subgraph', methods=['GET', 'POST'])
+  def get_subgraph(datasetid):
+    d = dataset_getter(datasetid, 'graph')
+    node_ids = _to_list('node') or []
+    if len(node_ids) > _max_query_nodes():
+      ns.abort(400, 'too many nodes, at most {0} are allowed'.format(_max_query_nodes()))
+    nodes, edges = d.subgraph([_to_id(n) for n in node_ids])
+    return _to_json(nodes, edges)
+
+  @app.route('/graph/<datasetid>/path')
+  @ns.etag
+  def get_path(datasetid):
+    d = dataset_getter(datasetid, 'graph')
+    source, target = ns.request.values.get('source'), ns.request.values.get('target')
+    if source is None or target is None:
+      ns.abort(400, 'missing parameter "source" or "target"')
+    max_depth = _to_int('max_depth', None)
+    path = d.shortest_path(_to_id(source), _to_id(target), direction=_to_direction('out'),
+                           edge_types=_to_edge_types(), max_depth=max_depth, max_nodes=_max_query_nodes())
+    if path is None:
+      ns.abort(404, 'no path found between "{0}" and "{1}"'.format(source, target))
+    return _to_json(*path)
+
+  @app.route('/graph/<datasetid>/batch', methods=['POST'])
+  def apply_batch(datasetid):
+    d = dataset_getter(datasetid, 'graph')
+    if not d.can_write():
+      ns.abort(403)
+    data = ns.request.get_json(silent=True)
+    if data is None:
+      data = _to_desc()
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list):
+      ns.abort(400, 'expected a list of operations')
+    results = d.apply_batch(operations)
+    return jsonify(_with_size(d, results=results))
+
+  @app.route('/graph/<datasetid>/stream', methods=['POST'])
+  def stream_upload(datasetid):
+    """
+    adds the nodes and edges of a json graph in the request body while it is read, such that neither the
+    body nor the parsed graph have to be kept in memory. A graph that does not exist yet is created first, described
+    by the query arguments. The body is not limited by max_file_size but by phovea_server.graph.max_stream_size.
+    Nodes have to be listed before the edges connecting them.
+    """
+    from .graph_parser import iter_json_graph
+    d = _create_graph(dataset_getter, datasetid)
+    if not d.can_write():
+      ns.abort(403)
+    stream = ns.request.stream
+    max_size = _max_stream_size()
+    if max_size:
+      if (ns.request.content_length or 0) > max_size:
+        ns.abort(413)
+      # the content length is not given for chunked requests
+      stream = _SizeLimitedStream(stream, max_size)
+    try:
+      stats = d.load_batches(iter_json_graph(stream, stream_chunk_size()))
+    except ValueError as e:
+      ns.abort(400, 'invalid json graph: {0}'.format(e))
+    return jsonify(_with_size(d, results=stats))
+
   list_nodes, handle_node = _list_type(dataset_getter, 'node')
-  app.add_url_rule('/graph/<datasetid>/node', 'list_nodes', ns.etag(list_nodes), methods=['GET', 'POST', 'DELETE'])
+  app.add_url_rule('/graph/<datasetid>/node', 'list_nodes', ns.etag_version(_graph_version(dataset_getter))(list_nodes), methods=['GET', 'POST', 'DELETE'])
   app.add_url_rule('/graph/<datasetid>/node/<int:itemid>', 'handle_node', ns.etag(handle_node), methods=['GET', 'PUT', 'DELETE'])
 
   list_edges, handle_edge = _list_type(dataset_getter, 'edge')
-  app.add_url_rule('/graph/<datasetid>/edge', 'list_edges', ns.etag(list_edges), methods=['GET', 'POST', 'DELETE'])
+  app.add_url_rule('/graph/<datasetid>/edge', 'list_edges', ns.etag_version(_graph_version(dataset_getter))(list_edges), methods=['GET', 'POST', 'DELETE'])
   app.add_url_rule('/graph/<datasetid>/edge/<int:itemid>', 'handle_edge', ns.etag(handle_edge), methods=['GET', 'PUT', 'DELETE'])
 
   # websocket = ws.Socket(app)
@@ -0,0 +1,298 @@
+###############################################################################
+# Caleydo - Visualization for Molecular Biology - http://caleydo.org
+# Copyright (c) The Caleydo Team. All rights reserved.
+# Licensed under the new BSD license, available at http://caleydo.org/license
+###############################################################################
+
+
+"""
+parsers and formatters of graphs as delimited edge lists, GraphML and numpy npz archives
+"""
+
+import io
+import json
+import numpy as np
+from . import ns
+from .util import to_json
+from .graph import stream_chunk_size
+
+
+_GRAPHML_NS = 'http://graphml.graphdrawing.org/xmlns'
+_GRAPHML_TYPES = dict(boolean=lambda v: v.strip().lower() == 'true', int=int, long=int, float=float, double=float,
+                      string=str)
+
+
+def _to_id(v):
+  try:
+    return int(v)
+  except (TypeError, ValueError):
+    return v
+
+
+def _to_value(v):
+  """
+  converts a text value back to a number if possible
+  """
+  for t in (int, float):
+    try:
+      return t(v)
+    except ValueError:
+      pass
+  return v
+
+
+def _input(args, files):
+  """
+  :return: binary stream of the uploaded file or of the desc argument
+  """
+  if files:
+    return files[0].stream
+  return io.BytesIO(args.get('desc', '').encode('utf-8'))
+
+
+def _chunks(dataset, name):
+  return dataset.iter_json(name, stream_chunk_size())
+
+
+def _attr_names(dataset, name):
+  names = []
+  seen = set()
+  for chunk in _chunks(dataset, name):
+    for item in chunk:
+      for k in item['attrs']:
+        if k not in seen:
+          seen.add(k)
+          names.append(k)
+  return names
+
+
+def parse_csv(args, files):
+  """
+  parses a delimited edge list with a header row. The columns source and target are required, id and type are
+  optional and all other columns are edge attributes. The nodes are derived from the sources and targets.
+  """
+  import csv
+  delimiter = args.get('delimiter', ',')
+  reader = csv.reader(io.TextIOWrapper(_input(args, files), encoding='utf-8', newline=''), delimiter=delimiter)
+  header = next(reader, None)
+  if header is None:
+    return dict(nodes=[], edges=[])
+  if 'source' not in header or 'target' not in header:
+    raise ValueError('the edge list requires a source and a target column')
+  source, target = header.index('source'), header.index('target')
+  id_column = header.index('id') if 'id' in header else None
+  type_column = header.index('type') if 'type' in header else None
+  attr_columns = [(i, k) for i, k in enumerate(header) if k not in ('id', 'source', 'target', 'type')]
+  required = max(i for i in (source, target, id_column, type_column) if i is not None)
+
+  nodes = {}
+  edges = []
+  for row in reader:
+    if not row:
+      continue
+    if len(row) <= required:
+      raise ValueError('line {0}: expected at least {1} columns but found {2}'.format(reader.line_num, required + 1, len(row)))
+    s, t = _to_id(row[source]), _to_id(row[target])
+    for n in (s, t):
+      if n not in nodes:
+        nodes[n] = dict(type='node', id=n, attrs={})
+    edges.append(dict(type=row[type_column] if type_column is not None else 'edge',
+                      id=_to_id(row[id_column]) if id_column is not None else len(edges),
+                      source=s, target=t,
+                      attrs={k: _to_value(row[i]) for i, k in attr_columns if i < len(row) and row[i] != ''}))
+  return dict(nodes=list(nodes.values()), edges=edges)
+
+
+def format_csv(dataset, args):
+  """
+  formats the edges of a graph as a delimited edge list
+  """
+  import csv
+  delimiter = args.get('f_delimiter', ',')
+  attrs = _attr_names(dataset, 'edges')
+
+  def gen():
+    out = io.StringIO()
+    w = csv.writer(out, delimiter=delimiter, lineterminator='\n')
+    w.writerow(['id', 'source', 'target', 'type'] + attrs)
+    for chunk in _chunks(dataset, 'edges'):
+      w.writerows([e['id'], e['source'], e['target'], e['type']] + [e['attrs'].get(k, '') for k in attrs] for e in chunk)
+      yield out.getvalue()
+      out.seek(0)
+      out.truncate()
+    yield out.getvalue()
+
+  return ns.Response(gen(), mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=graph.csv'})
+
+
+def parse_graphml(args, files):
+  """
+  parses a GraphML document incrementally. The data key named type is used as type of nodes and edges
+  """
+  import xml.etree.ElementTree as ET
+  keys = {}
+  nodes = []
+  edges = []
+  graph_attrs = {}
+  for _, elem in ET.iterparse(_input(args, files)):
+    tag = elem.tag.rsplit('}', 1)[-1]
+    if tag == 'key':
+      keys[elem.get('id')] = (elem.get('attr.name', elem.get('id')), _GRAPHML_TYPES.get(elem.get('attr.type'), str),
+                              elem.get('for'))
+    elif tag in ('node', 'edge'):
+      attrs = {}
+      for d in elem:
+        if d.tag.rsplit('}', 1)[-1] == 'data':
+          name, convert, _ = keys.get(d.get('key'), (d.get('key'), str, None))
+          attrs[name] = convert(d.text or '')
+      item = dict(type=attrs.pop('type', tag), id=_to_id(elem.get('id')), attrs=attrs)
+      if tag == 'node':
+        nodes.append(item)
+      else:
+        if item['id'] is None:
+          item['id'] = len(edges)
+        item['source'] = _to_id(elem.get('source'))
+        item['target'] = _to_id(elem.get('target'))
+        edges.append(item)
+      elem.clear()
+    elif tag == 'data' and keys.get(elem.get('key'), (None, None, None))[2] == 'graph':
+      name, convert, _ = keys[elem.get('key')]
+      graph_attrs[name] = convert(elem.text or '')
+  r = dict(nodes=nodes, edges=edges)
+  if graph_attrs:
+    r['attrs'] = graph_attrs
+  return r
+
+
+def _graphml_type(v):
+  if isinstance(v, bool):
+    return 'boolean'
+  if isinstance(v, int):
+    return 'long'
+  if isinstance(v, float):
+    return 'double'
+  return 'string'
+
+
+def _graphml_text(v, key_type):
+  if key_type == 'boolean':
+    return 'true' if v else 'false'
+  if isinstance(v, (str, int, float)) and not isinstance(v, bool):
+    return str(v)
+  return to_json(v)
+
+
+def format_graphml(dataset, args):
+  """
+  formats a graph as GraphML document, attributes are converted to GraphML data elements
+  """
+  from xml.sax.saxutils import quoteattr, escape
+
+  def key_types(name):
+    types = {}
+    for chunk in _chunks(dataset, name):
+      for item in chunk:
+        for k, v in item['attrs'].items():
+          t = _graphml_type(v)
+          types[k] = t if types.get(k, t) == t else 'string'
+    return types
+
+  keys = dict(node=key_types('nodes'), edge=key_types('edges'))
+
+  def data(kind, item):
+    r = ['<data key={0}>{1}</data>'.format(quoteattr(kind + '_type'), escape(str(item['type'])))]
+    for k, v in item['attrs'].items():
+      text = _graphml_text(v, keys[kind][k])
+      r.append('<data key={0}>{1}</data>'.format(quoteattr(kind + '_' + k), escape(text)))
+    return ''.join(r)
+
+  def gen():
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<graphml xmlns="{0}">\n'.format(_GRAPHML_NS)
+    for kind in ('node', 'edge'):
+      yield '<key id={0} for="{1}" attr.name="type" attr.type="string"/>\n'.format(quoteattr(kind + '_type'), kind)
+      for k, t in keys[kind].items():
+        yield '<key id={0} for="{1}" attr.name={2} attr.type="{3}"/>\n'.format(
+            quoteattr(kind + '_' + k), kind, quoteattr(k), t)
+    yield '<graph id={0} edgedefault="directed">\n'.format(quoteattr(str(dataset.id)))
+    for chunk in _chunks(dataset, 'nodes'):
+      yield ''.join('<node id={0}>{1}</node>\n'.format(quoteattr(str(n['id'])), data('node', n)) for n in chunk)
+    for chunk in _chunks(dataset, 'edges'):
+      yield ''.join('<edge id={0} source={1} target={2}>{3}</edge>\n'.format(
+          quoteattr(str(e['id'])), quoteattr(str(e['source'])), quoteattr(str(e['target'])), data('edge', e))
+          for e in chunk)
+    yield '</graph>\n</graphml>\n'
+
+  return ns.Response(gen(), mimetype='application/xml; charset=utf-8',
+                     headers={'Content-Disposition': 'attachment;filename=graph.graphml'})
+
+
+def _to_id_array(ids):
+  a = np.asarray(ids)
+  if a.dtype.kind not in 'iu':
+    # mixed or textual ids
+    a = np.asarray([str(i) for i in ids], dtype=str)
+  return a
+
+
+def parse_npz(args, files):
+  """
+  parses a numpy npz archive as written by format_npz
+  """
+  data = np.load(_input(args, files), allow_pickle=False)
+  types = data['types'].tolist()
+
+  def attrs(name):
+    return {k: {_to_id(i): v for i, v in values.items()} for k, values in json.loads(str(data[name])).items()}
+
+  node_attrs, edge_attrs = attrs('node_attrs'), attrs('edge_attrs')
+
+  def get_attrs(columns, id):
+    return {k: c[id] for k, c in columns.items() if id in c}
+
+  nodes = [dict(type=types[t], id=id, attrs=get_attrs(node_attrs, id))
+           for id, t in zip(data['node_ids'].tolist(), data['node_types'].tolist())]
+  edges = [dict(type=types[t], id=id, source=s, target=tt, attrs=get_attrs(edge_attrs, id))
+           for id, t, s, tt in zip(data['edge_ids'].tolist(), data['edge_types'].tolist(),
+                                   data['edge_sources'].tolist(), data['edge_targets'].tolist())]
+  return dict(nodes=nodes, edges=edges)
+
+
+def _to_columns(dataset):
+  types = {}
+  columns = dict(node_ids=[], node_types=[], edge_ids=[], edge_types=[], edge_sources=[], edge_targets=[],
+                 node_attrs={}, edge_attrs={})
+  for name, kind in (('nodes', 'node'), ('edges', 'edge')):
+    for chunk in _chunks(dataset, name):
+      for item in chunk:
+        columns[kind + '_ids'].append(item['id'])
+        columns[kind + '_types'].append(types.setdefault(item['type'], len(types)))
+        if kind == 'edge':
+          columns['edge_sources'].append(item['source'])
+          columns['edge_targets'].append(item['target'])
+        for k, v in item['attrs'].items():
+          columns[kind + '_attrs'].setdefault(k, {})[item['id']] = v
+  columns['types'] = list(types.keys())
+  return columns
+
+
+def format_npz(dataset, args):
+  """
+  formats a graph as compressed numpy npz archive of columns: the ids, interned types, sources and targets as arrays
+  and the sparse attributes as json
+  """
+  # columnar graphs provide their columns directly
+  columns = dataset.columns() if hasattr(dataset, 'columns') else _to_columns(dataset)
+  arrays = {}
+  for k, v in columns.items():
+    if k.endswith('_attrs'):
+      arrays[k] = np.asarray(to_json({name: {str(id): value for id, value in c.items()} for name, c in v.items()}))
+    elif k == 'types':
+      arrays[k] = np.asarray(v, dtype=str)
+    elif k.endswith('_types'):
+      arrays[k] = np.asarray(v, dtype=np.int32)
+    else:
+      arrays[k] = _to_id_array(v)
+  out = io.BytesIO()
+  np.savez_compressed(out, **arrays)
+  return ns.Response(out.getvalue(), mimetype='application/octet-stream',
+                     headers={'Content-Disposition': 'attachment;filename=graph.npz'})
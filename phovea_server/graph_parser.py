@@ -6,6 +6,13 @@
 
 
 def parse_json(args, files):
+  """
+  parses a json graph given by the uploaded file or by the desc argument
+  """
+  if files:
+    r = {k: v for k, v in args.items() if k != 'desc'}
+    r.update(parse_json_stream(args, files))
+    return r
   if 'desc' in args:
     import json
     args = json.loads(args['desc'])
@@ -14,3 +21,145 @@ def parse_json(args, files):
   if 'edges' not in args:
     args['edges'] = []
   return args
+
+
+_BLOCK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+
+
+class _JSONStreamReader(object):
+  """
+  reads json values one after the other from a binary stream, keeping only the not yet parsed text in memory
+  """
+
+  def __init__(self, stream, block_size=_BLOCK_SIZE):
+    import codecs
+    import json
+    self._stream = stream
+    self._block_size = block_size
+    self._decoder = codecs.getincrementaldecoder('utf-8')()
+    self._json = json.JSONDecoder()
+    self._buffer = ''
+    self._pos = 0
+    self._eof = False
+
+  def _fill(self):
+    if self._eof:
+      return False
+    block = self._stream.read(self._block_size)
+    if not block:
+      self._eof = True
+    self._buffer = self._buffer[self._pos:] + self._decoder.decode(block or b'', final=not block)
+    self._pos = 0
+    return True
+
+  def peek(self):
+    """
+    :return: the next non whitespace character or '' at the end of the stream
+    """
+    while True:
+      while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+        self._pos += 1
+      if self._pos < len(self._buffer) or not self._fill():
+        return self._buffer[self._pos:self._pos + 1]
+
+  def expect(self, chars):
+    c = self.peek()
+    if not c or c not in chars:
+      raise ValueError('invalid json: expected one of "{0}" but found "{1}"'.format(chars, c))
+    self._pos += 1
+    return c
+
+  def value(self):
+    """
+    :return: the next json value
+    """
+    self.peek()
+    while True:
+      try:
+        v, end = self._json.raw_decode(self._buffer, self._pos)
+        # a value at the end of the buffer might be incomplete, e.g. a number
+        if end < len(self._buffer) or self._eof:
+          self._pos = end
+          return v
+      except ValueError:
+        if self._eof:
+          raise
+      self._fill()
+
+
+def iter_json_graph(stream, chunk_size=1000):
+  """
+  parses a json graph of the form {"nodes": [...], "edges": [...], ...} incrementally from the given binary stream
+  :param stream: binary file like object
+  :param chunk_size: the maximal number of nodes or edges per chunk
+  :return: generator of tuples (key, value), where the nodes and edges are given in chunks as ('nodes', [nodes]) and
+  ('edges', [edges]) and all other entries of the graph as they are
+  """
+  reader = _JSONStreamReader(stream)
+  reader.expect('{')
+  if reader.peek() == '}':
+    return
+  while True:
+    key = reader.value()
+    reader.expect(':')
+    if key in ('nodes', 'edges') and reader.peek() == '[':
+      reader.expect('[')
+      chunk = []
+      if reader.peek() != ']':
+        while True:
+          chunk.append(reader.value())
+          if len(chunk) >= chunk_size:
+            yield key, chunk
+            chunk = []
+          if reader.expect(',]') == ']':
+            break
+      else:
+        reader.expect(']')
+      if chunk:
+        yield key, chunk
+    else:
+      yield key, reader.value()
+    if reader.expect(',}') == '}':
+      return
+
+
+def to_batches(graph, chunk_size=1000):
+  """
+  splits a parsed graph into the batches of a batch parser
+  :param graph: dict with the lists nodes and edges
+  :return: generator of (key, value) tuples like iter_json_graph
+  """
+  for key, value in graph.items():
+    if key not in ('nodes', 'edges'):
+      yield key, value
+  for key in ('nodes', 'edges'):
+    items = graph.get(key) or []
+    for i in range(0, len(items), chunk_size):
+      yield key, items[i:i + chunk_size]
+
+
+def iter_json_upload(args, files, chunk_size=1000):
+  """
+  batch parser of a json graph, reading an uploaded file incrementally
+  :return: generator of (key, value) tuples, see iter_json_graph
+  """
+  if files:
+    return iter_json_graph(files[0].stream, chunk_size)
+  return to_batches(parse_json(args, []), chunk_size)
+
+
+def parse_json_stream(args, files):
+  """
+  variant of parse_json reading the uploaded file incrementally instead of loading the whole text at once. The result
+  is still the whole graph, use graph.parse_batches to process it in batches
+  """
+  if not files:
+    return parse_json(args, files)
+  r = dict(nodes=[], edges=[])
+  for key, value in iter_json_graph(files[0].stream):
+    if key in ('nodes', 'edges'):
+      r[key].extend(value)
+    else:
+      r[key] = value
+  return r
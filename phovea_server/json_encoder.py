@@ -28,13 +28,20 @@ class NumpyTablesEncoder(object):
     return False
 
   def __call__(self, obj, base_encoder):
+    if type(obj) is np.ndarray and obj.dtype.kind in 'biuf':
+      # plain numeric arrays are converted at once
+      if obj.dtype.kind == 'f':
+        nan = np.isnan(obj)
+        if nan.any():
+          return np.where(nan, None, obj.astype(object)).tolist()
+      return obj.tolist()
     if isinstance(obj, np.ndarray):
       if obj.ndim == 1:
         return [base_encoder.default(x) for x in obj]
       else:
         return [base_encoder.default(obj[i]) for i in range(obj.shape[0])]
     if isinstance(obj, np.generic):
-      a = np.asscalar(obj)
+      a = obj.item()
       if (isinstance(a, float) and np.isnan(a)) or ma.is_masked(a):
         return None
       return a
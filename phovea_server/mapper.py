@@ -6,99 +6,471 @@
 
 
 from builtins import object, set
-from .plugin import list as list_plugin
+from .plugin import list as list_plugin, lookup as lookup_plugin
+from .config import view
+from .search_index import SearchIndex, rank_key
 from itertools import chain
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import List
+import heapq
 import logging
+import numpy as np
+import threading
+import time
 
 _log = logging.getLogger(__name__)
 
 
+_MISSING = object()
+_COST_LEARNING_RATE = 0.2
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE_NAME = 'mapping_snapshot.json'
+
+
+def _to_array(ids):
+  if isinstance(ids, np.ndarray):
+    return ids
+  r = np.empty(len(ids), dtype=object)
+  try:
+    r[:] = ids
+  except ValueError:  # e.g. ids are tuples of the same length
+    for i, id in enumerate(ids):
+      r[i] = id
+  return r
+
+
+def _to_list(ids):
+  return ids.tolist() if isinstance(ids, np.ndarray) else ids
+
+
+def lists_to_csr(lists, flat_list=False):
+  """
+  converts a list of lists of mapped ids to the CSR like (values, offsets) format, None entries are treated as empty lists
+  :param flat_list: return the values as a flat list instead of a numpy array
+  """
+  try:
+    lengths = np.fromiter(map(len, lists), dtype=np.intp, count=len(lists))
+  except TypeError:  # contains None entries
+    lists = [l if l is not None else [] for l in lists]
+    lengths = np.fromiter(map(len, lists), dtype=np.intp, count=len(lists))
+  offsets = np.zeros(len(lists) + 1, dtype=np.intp)
+  np.cumsum(lengths, out=offsets[1:])
+  values = list(chain.from_iterable(lists))
+  return (values if flat_list else _to_array(values)), offsets
+
+
+def csr_to_lists(values, offsets):
+  """
+  converts the CSR like (values, offsets) format to a list of lists of mapped ids
+  """
+  values = _to_list(values)
+  bounds = _to_list(np.asarray(offsets))
+  return [values[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class MappingCache(object):
+  """
+  Bounded LRU cache of mapping results keyed by (from_idtype, to_idtype, id) with an optional time to live.
+  """
+  def __init__(self, max_size=10000, ttl=None):
+    """
+    :param max_size: maximal number of cached ids
+    :param ttl: optional time to live of an entry in seconds
+    """
+    self.max_size = max_size
+    self.ttl = ttl if ttl and ttl > 0 else None
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def resolve(self, from_idtype, to_idtype, ids, compute):
+    """
+    resolves the given ids using the cache, only the unique cache misses are passed to compute
+    :param compute: function mapping a list of ids to a list of results
+    :return: list of results in the order of the given ids
+    """
+    now = time.monotonic()
+    result = []
+    missing = OrderedDict()
+    with self._lock:
+      for i, id in enumerate(ids):
+        key = (from_idtype, to_idtype, id)
+        entry = self._entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > now):
+          self._entries.move_to_end(key)
+          self.hits += 1
+          result.append(entry[0])
+        else:
+          self.misses += 1
+          result.append(_MISSING)
+          missing.setdefault(id, []).append(i)
+
+    if not missing:
+      return result
+
+    missing_ids = list(missing.keys())
+    values = compute(missing_ids)
+    expires = now + self.ttl if self.ttl is not None else None
+    with self._lock:
+      for id, value in zip(missing_ids, values):
+        for i in missing[id]:
+          result[i] = value
+        key = (from_idtype, to_idtype, id)
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+      while len(self._entries) > self.max_size:
+        self._entries.popitem(last=False)
+    return result
+
+  def invalidate(self, predicate):
+    """
+    removes all entries whose (from_idtype, to_idtype) pair matches the given predicate
+    """
+    checked = {}
+    with self._lock:
+      for key in list(self._entries.keys()):
+        pair = key[:2]
+        if pair not in checked:
+          checked[pair] = predicate(*pair)
+        if checked[pair]:
+          del self._entries[key]
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self):
+    return dict(hits=self.hits, misses=self.misses, size=len(self._entries), max_size=self.max_size, ttl=self.ttl)
+
+
+def _to_paths(start, parents):
+  """
+  reconstructs the paths from start to every node of the given parent map
+  """
+  paths = {}
+  for node in parents:
+    if node == start:
+      continue
+    path = []
+    act = node
+    while act is not None:
+      path.append(act)
+      act = parents[act]
+    path.reverse()
+    paths[node] = path
+  return paths
+
+
 class MappingManager(object):
   """
   Mapping manager creating a graph of all available id-2-id mappings, allowing for transitive id-mappings.
   This graph is traversed via shortest path when mapping from one id-(type) to another.
+
+  A mapper is a callable mapping a list of ids to a list of lists of mapped ids. The following optional
+  attributes define how a mapper is called:
+   * preserves_order: the mapper is called once with all ids and returns the results in the same order
+   * keyed_results: the mapper is called once with the unique ids and returns a dict id -> list of mapped ids or
+     a pair of arrays (ids, list of mapped ids)
+   * csr_results: the mapper is called once with a numpy array of ids and returns a pair of arrays (values, offsets),
+     such that the ids mapped from ids[i] are values[offsets[i]:offsets[i+1]]. Consecutive hops of such mappers are
+     combined without creating nested lists.
+  Otherwise the mapper is called once per id.
+
+  A mapper can give a `cost` hint, e.g., its latency in milliseconds per call. Mappings follow the path with the
+  lowest total cost, which defaults to the path with the fewest hops.
+
+  Besides a `search(query, max_results)` method a mapper can support searching via:
+   * search_keys: function returning all names of the from idtype, used to build an in-memory search index
+   * search_version: changes whenever the names returned by search_keys change to trigger a rebuild of the index
   """
-  def __init__(self, providers):
-    self.mappers = {}
-    self.paths = {}
+  def __init__(self, providers, cache=None, concurrent=False, timeout=None, max_workers=8, search_index=False, learn_costs=False):
+    """
+    :param providers: list of (from_idtype, to_idtype, mapper) tuples
+    :param cache: optional MappingCache for caching the results of transitive mappings
+    :param concurrent: whether multiple mappers of the same edge should be called in parallel
+    :param timeout: optional timeout in seconds for a mapper in the concurrent mode, results of slower mappers are skipped
+    :param max_workers: maximal number of workers in the concurrent mode
+    :param search_index: whether searches should use an in-memory index for mappers providing `search_keys()`
+    :param learn_costs: whether the edge costs should be learned from the observed mapping latencies
+    """
+    self._mappers = {}
+    self._cache = cache
+    self._concurrent = concurrent
+    self._timeout = timeout if timeout and timeout > 0 else None
+    self._max_workers = max_workers
+    self._executor = None
+    self._search_index_enabled = search_index
+    # id(mapper) -> (mapper, version, SearchIndex)
+    self._search_indices = {}
+    # adjacency list of the idtype graph in registration order, used for the shortest path lookup
+    self._graph = {}
+    # (from_idtype, to_idtype) -> cost derived from the cost hints of the mappers
+    self._static_costs = {}
+    self._weighted = False
+    self._known_idtypes = set()
+    # lazily computed shortest paths: from_idtype -> {to_idtype: path}
+    self._paths = {}
+    self._learn_costs = learn_costs
+    # (from_idtype, to_idtype) -> learned latency and the latency the memoized paths are based on
+    self._observed_costs = {}
+    self._cost_basis = {}
+    # function loading the providers of a manager restored from a snapshot
+    self._loader = None
+    self._on_outdated_snapshot = None
+    self._load_lock = threading.Lock()
+    self.__register(providers)
+
+  def __register(self, providers):
+    mappers = {}
     graph = {}
     for (from_idtype, to_idtype, mapper) in providers:
       # generate mapper mapping
-      from_mappings = self.mappers.get(from_idtype, {})
-      self.mappers[from_idtype] = from_mappings
+      from_mappings = mappers.get(from_idtype, {})
+      mappers[from_idtype] = from_mappings
       to_mappings = from_mappings.get(to_idtype, [])
       from_mappings[to_idtype] = to_mappings
       to_mappings.append(mapper)
       # generate type graph
-      from_graph = graph.get(from_idtype, [])
-      from_graph.append(to_idtype)
-      graph[from_idtype] = from_graph
-    # generate path map
-    entries = self.known_idtypes()
-    for _from in entries:
-      # calculate all paths
-      all_paths = {_to: self.__find_all_paths(graph, _from, _to) for _to in entries if _to != _from}
-      # remove missing paths
-      for key, value in list(all_paths.items()):
-        if not value:
-          del all_paths[key]
-      self.paths[_from] = all_paths
+      from_graph = graph.setdefault(from_idtype, [])
+      if to_idtype not in from_graph:
+        from_graph.append(to_idtype)
+
+    self._mappers = mappers
+    self._graph = graph
+    self._weighted = any(hasattr(mapper, 'cost') for v in mappers.values() for to_mappings in v.values() for mapper in to_mappings)
+    self._static_costs = {}
+    if self._weighted:
+      for from_idtype, from_mappings in mappers.items():
+        for to_idtype, to_mappings in from_mappings.items():
+          costs = [getattr(mapper, 'cost', 1) for mapper in to_mappings]
+          self._static_costs[(from_idtype, to_idtype)] = max(costs) if self._concurrent else sum(costs)
+    self._known_idtypes = self.__compute_known_idtypes()
+    self._paths = {}
+
+  @property
+  def mappers(self):
+    """
+    the registered mappers: from_idtype -> to_idtype -> list of mappers
+    """
+    self.__ensure_loaded()
+    return self._mappers
+
+  def __ensure_loaded(self):
+    if self._loader is not None:
+      self.__load_providers()
+
+  @classmethod
+  def from_snapshot(cls, snapshot, load_providers, on_outdated=None, **kwargs):
+    """
+    restores a manager from a snapshot created by `to_snapshot`. The idtype graph and the path table are taken
+    from the snapshot, while the providers are loaded not until the first mapping or search.
+    :param snapshot: the snapshot dict
+    :param load_providers: function returning the list of (from_idtype, to_idtype, mapper) tuples
+    :param on_outdated: optional function called with the manager if the loaded providers don't match the snapshot
+    :param kwargs: further arguments of the constructor
+    """
+    manager = cls([], **kwargs)
+    manager._graph = {k: list(v) for k, v in snapshot['graph'].items()}
+    manager._static_costs = {(a, b): c for a, b, c in snapshot['costs']}
+    manager._weighted = snapshot['weighted']
+    manager._known_idtypes = set(snapshot['idtypes'])
+    manager._paths = {k: dict(v) for k, v in snapshot['paths'].items()}
+    manager._loader = load_providers
+    manager._on_outdated_snapshot = on_outdated
+    return manager
+
+  def to_snapshot(self, fingerprint=None):
+    """
+    creates a json compatible snapshot of the idtype graph and the complete path table
+    :param fingerprint: optional fingerprint of the provider set to store along
+    """
+    return dict(version=SNAPSHOT_VERSION,
+                fingerprint=fingerprint,
+                graph=self._graph,
+                costs=[[a, b, c] for (a, b), c in self._static_costs.items()],
+                weighted=self._weighted,
+                idtypes=sorted(self._known_idtypes),
+                paths={from_idtype: self._shortest_paths(from_idtype) for from_idtype in self._graph})
+
+  def __load_providers(self):
+    with self._load_lock:
+      if self._loader is None:  # loaded in the meanwhile
+        return
+      graph, costs, paths = self._graph, self._static_costs, self._paths
+      self.__register(self._loader())
+      self._loader = None
+      outdated = graph != self._graph or costs != self._static_costs
+      if not outdated:
+        # keep the paths of the snapshot
+        self._paths = paths
+    if outdated:
+      _log.warning('mapping providers do not match the snapshot, recomputing the mapping paths')
+      if self._on_outdated_snapshot:
+        self._on_outdated_snapshot(self)
 
   def known_idtypes(self):
     """
     returns a set of a all known id types in this mapping graph
     :return:
     """
+    return set(self._known_idtypes)
+
+  def __compute_known_idtypes(self):
     s = set()
-    for from_, v in self.mappers.items():
+    for from_, v in self._mappers.items():
       s.add(from_)
       for to_ in list(v.keys()):
         s.add(to_)
     return s
 
-  def __find_all_paths(self, graph, start, end, path=[]):
+  def __find_shortest_paths(self, start):
     """
-    Returns all possible paths in the graph from start to end
-    :return: Array of all possible paths (string arrays) sorted by shortest path first
+    Computes the cheapest path from start to every reachable idtype using Dijkstra's algorithm.
+    Ties are broken by the number of hops and then by the registration order of the edges, such that without
+    any cost hints the path is the one that the former exhaustive path enumeration ranked first.
+    :return: dict of to_idtype -> path (string array)
     """
-    path = path + [start]
-    if start == end:
-      return [path]
-    if start not in graph:
-      return []
-    paths = []
-    for node in graph[start]:
-      if node not in path:
-        newpaths = self.__find_all_paths(graph, node, end, path)
-        for newpath in newpaths:
-          paths.append(newpath)
-    return sorted(paths, key=len)
+    if not self._weighted and not self._observed_costs:
+      return self.__find_fewest_hops_paths(start)
+
+    parents = {}
+    heap = [(0, 0, (), start, None)]
+    while heap:
+      cost, hops, order, node, parent = heapq.heappop(heap)
+      if node in parents:
+        continue
+      parents[node] = parent
+      for i, neighbor in enumerate(self._graph.get(node, [])):
+        if neighbor not in parents:
+          heapq.heappush(heap, (cost + self.edge_cost(node, neighbor), hops + 1, order + (i,), neighbor, node))
+    return _to_paths(start, parents)
+
+  def __find_fewest_hops_paths(self, start):
+    """
+    breadth first search variant for unit edge costs, neighbors are visited in registration order
+    """
+    parents = {start: None}
+    queue = deque([start])
+    while queue:
+      node = queue.popleft()
+      for neighbor in self._graph.get(node, []):
+        if neighbor not in parents:
+          parents[neighbor] = node
+          queue.append(neighbor)
+    return _to_paths(start, parents)
+
+  def edge_cost(self, from_idtype, to_idtype):
+    """
+    the cost of mapping along the given edge. It is the observed latency in milliseconds if costs are learned,
+    otherwise the `cost` hints of the edge's mappers are summed up (or the maximum in the concurrent mode).
+    Without any cost hints every edge costs 1, i.e., the path with the fewest hops is chosen.
+    """
+    observed = self._observed_costs.get((from_idtype, to_idtype))
+    if observed is not None:
+      return observed
+    if not self._weighted:
+      return 1
+    return self._static_costs[(from_idtype, to_idtype)]
+
+  def __observe(self, from_idtype, to_idtype, start):
+    """
+    updates the learned cost of the given edge using an exponentially weighted moving average of the latency.
+    Memoized paths are dropped if the cost changed considerably since they were computed.
+    """
+    if not self._learn_costs:
+      return
+    edge = (from_idtype, to_idtype)
+    latency = (time.monotonic() - start) * 1000
+    observed = self._observed_costs.get(edge)
+    observed = latency if observed is None else observed + _COST_LEARNING_RATE * (latency - observed)
+    self._observed_costs[edge] = observed
+    basis = self._cost_basis.get(edge)
+    if basis is None or not (basis / 2 <= observed <= basis * 2):
+      self._cost_basis[edge] = observed
+      self._paths = {}
+
+  def _shortest_paths(self, from_idtype):
+    """
+    :return: the memoized shortest paths starting at the given idtype
+    """
+    paths = self._paths.get(from_idtype)
+    if paths is None:
+      paths = self.__find_shortest_paths(from_idtype)
+      self._paths[from_idtype] = paths
+    return paths
+
+  def path(self, from_idtype, to_idtype):
+    """
+    :return: the shortest path (string array) from the given idtype to the target one or None if there is none
+    """
+    if from_idtype not in self._graph:
+      return None
+    return self._shortest_paths(from_idtype).get(to_idtype)
+
+  def invalidate(self, idtype=None):
+    """
+    invalidates the cached mapping results, e.g., when a provider changed its mapping tables
+    :param idtype: optional idtype to invalidate only the mappings whose path includes this idtype
+    """
+    self.__invalidate_search_indices(idtype)
+    if self._cache is None:
+      return
+    if idtype is None:
+      self._cache.clear()
+      return
+
+    def affected(from_idtype, to_idtype):
+      path = self.path(from_idtype, to_idtype)
+      return path is not None and idtype in path
+
+    self._cache.invalidate(affected)
+
+  def __invalidate_search_indices(self, idtype):
+    for from_idtype, from_mappings in self._mappers.items():
+      for to_idtype, to_mappings in from_mappings.items():
+        if idtype is None or idtype in (from_idtype, to_idtype):
+          for mapper in to_mappings:
+            self._search_indices.pop(id(mapper), None)
+
+  def cache_stats(self):
+    """
+    :return: dict with the hit/miss counters of the result cache or None if caching is disabled
+    """
+    return self._cache.stats() if self._cache is not None else None
 
   def __resolve_single(self, from_idtype, to_idtype, ids):
+    start = time.monotonic()
+    result = self.__resolve_edge(from_idtype, to_idtype, ids)
+    self.__observe(from_idtype, to_idtype, start)
+    return result
+
+  def __resolve_edge(self, from_idtype, to_idtype, ids):
     from_mappings = self.mappers.get(from_idtype, {})
     to_mappings = from_mappings.get(to_idtype, [])
     if not to_mappings:
       _log.warn('cannot find mapping from %s to %s', from_idtype, to_idtype)
       return [None for _ in ids]
 
-    def apply_mapping(mapper, ids: List[str]):
-      # Each mapper can define if it preserves the order of the incoming ids.
-      if hasattr(mapper, 'preserves_order') and mapper.preserves_order:
-        return mapper(ids)
-      else:
-        # If this is not the case, we need to map every single id separately
-        return [mapper([id])[0] for id in ids]
-
     if len(to_mappings) == 1:
       # single mapping no need for merging
-      return apply_mapping(to_mappings[0], ids)
+      return self.__apply_mapping(to_mappings[0], ids)
+
+    if self._concurrent:
+      mapped = self.__apply_concurrently(from_idtype, to_idtype, to_mappings, ids)
+    else:
+      mapped = (self.__apply_mapping(mapper, ids) for mapper in to_mappings)
 
     # two way to preserve the order of the results
     r = [[] for _ in ids]
     rset = [set() for _ in ids]
-    for mapper in to_mappings:
-      mapped_ids = apply_mapping(mapper, ids)
+    for mapped_ids in mapped:
+      if mapped_ids is None:  # mapper timed out
+        continue
       for mapped_id, rlist, rhash in zip(mapped_ids, r, rset):
         for id in mapped_id:
           if id not in rhash:
@@ -106,6 +478,50 @@ class MappingManager(object):
             rhash.add(id)
     return r
 
+  def __apply_mapping(self, mapper, ids: List[str]):
+    # Each mapper can define if it preserves the order of the incoming ids.
+    if getattr(mapper, 'csr_results', False):
+      return csr_to_lists(*mapper(_to_array(ids)))
+    if hasattr(mapper, 'preserves_order') and mapper.preserves_order:
+      return mapper(ids)
+    elif getattr(mapper, 'keyed_results', False):
+      # Mappers returning results keyed by input id are called once and the order is restored here
+      return self.__apply_keyed_mapping(mapper, ids)
+    else:
+      # If this is not the case, we need to map every single id separately
+      return [mapper([id])[0] for id in ids]
+
+  def __apply_concurrently(self, from_idtype, to_idtype, mappers, ids):
+    """
+    calls all mappers in parallel
+    :return: list of the mapping results in the order of the mappers, None for mappers that exceeded the timeout
+    """
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='mapping')
+    futures = [self._executor.submit(self.__apply_mapping, mapper, ids) for mapper in mappers]
+    deadline = time.monotonic() + self._timeout if self._timeout else None
+    results = []
+    for mapper, future in zip(mappers, futures):
+      try:
+        results.append(future.result(max(0, deadline - time.monotonic()) if deadline is not None else None))
+      except FutureTimeoutError:
+        _log.warning('mapper %s from %s to %s exceeded the timeout of %ss, skipping its results', mapper, from_idtype, to_idtype, self._timeout)
+        results.append(None)
+    return results
+
+  @staticmethod
+  def __apply_keyed_mapping(mapper, ids):
+    """
+    calls a mapper with keyed results once with the unique ids.
+    The mapper returns either a dict id -> list of mapped ids or a pair of arrays (ids, list of mapped ids).
+    Ids which are missing in the result are mapped to an empty list.
+    """
+    result = mapper(list(OrderedDict.fromkeys(ids)))
+    if not isinstance(result, dict):
+      keys, values = result
+      result = dict(zip(keys, values))
+    return [result.get(id, []) for id in ids]
+
   def merge_2d_arrays(self, source, lengths):
     """
     Merges the arrays of the source array according to the lengths array
@@ -125,86 +541,236 @@ class MappingManager(object):
     return result
 
   def can_map(self, from_idtype, to_idtype):
-    return self.paths.get(from_idtype, {}).get(to_idtype)
+    path = self.path(from_idtype, to_idtype)
+    return [path] if path else None
 
   def maps_to(self, from_idtype):
-    return list(self.paths.get(from_idtype, {}).keys())
+    if from_idtype not in self._graph:
+      return []
+    return list(self._shortest_paths(from_idtype).keys())
 
   def __call__(self, from_idtype, to_idtype, ids):
     # If both id types are the same, simply return
     if from_idtype == to_idtype:
       return ids
 
-    # Get stored path instead of calculating them "on the fly"
-    # paths = self.__find_all_paths(self.graph, from_idtype, to_idtype)
-    paths = self.paths.get(from_idtype, {}).get(to_idtype)
+    self.__ensure_loaded()
+    # Traverse the memoized shortest path
+    path = self.path(from_idtype, to_idtype)
 
-    if not paths:
+    if not path:
       _log.warn('Cannot find mapping from %s to %s', from_idtype, to_idtype)
       return [None for _ in ids]
 
-    # Traverse shortest path only for now
-    path = paths[0]
     if len(path) < 2:
       _log.warn('Invalid path given: %s', path)
       return [None for _ in ids]
 
+    _log.debug('map %d ids from %s to %s via %s', len(ids), from_idtype, to_idtype, path)
+    if self._cache is None:
+      return self.__map_path(path, ids)
+    return self._cache.resolve(from_idtype, to_idtype, ids, lambda missing: self.__map_path(path, missing))
+
+  def map_csr(self, from_idtype, to_idtype, ids):
+    """
+    maps the given ids similar to calling the manager but returns the result in a CSR like format:
+    a flat array of all mapped ids and an offsets array, such that the ids mapped from ids[i] are
+    values[offsets[i]:offsets[i+1]]. Ids that cannot be mapped result in an empty range.
+    :return: tuple (values, offsets)
+    """
+    if from_idtype == to_idtype:
+      return _to_array(ids), np.arange(len(ids) + 1, dtype=np.intp)
+
+    self.__ensure_loaded()
+    path = self.path(from_idtype, to_idtype)
+    if not path or len(path) < 2:
+      _log.warning('Cannot find mapping from %s to %s', from_idtype, to_idtype)
+      return _to_array([]), np.zeros(len(ids) + 1, dtype=np.intp)
+
+    if self._cache is None:
+      values, offsets = self.__map_path_csr(path, ids)
+      return _to_array(values), offsets
+    return lists_to_csr(self._cache.resolve(from_idtype, to_idtype, ids, lambda missing: self.__map_path(path, missing)))
+
+  def __map_path(self, path, ids):
+    if len(path) == 2 and not self.__is_csr_edge(path[0], path[1]):
+      # a single hop, no need for flattening and merging
+      return self.__resolve_single(path[0], path[1], ids)
+    return csr_to_lists(*self.__map_path_csr(path, ids))
+
+  def __map_path_csr(self, path, ids):
     values = ids
-    needs_merging = False
-    lengths = []
+    offsets = np.arange(len(ids) + 1, dtype=np.intp)
     # Iterate over from, to tuples
-    for i in range(1, len(path)):
-      from_type = path[i-1]
-      to_type = path[i]
-      result = self.__resolve_single(from_type, to_type, values)
-
-      # Check if needs merging
-      if needs_merging:
-        result = self.merge_2d_arrays(result, lengths)
-
-      # Return on last iteration
-      if i == len(path)-1:
-        return result
-
-      # Otherwise, check if every mapping was 1 to 1
-      lengths = [len(x) for x in result]
-      # If any result array is longer than 1, we need to flatten and later merge it
-      needs_merging = max(lengths, default=0) > 1
-      # Flatten result and assign to values
-      values = list(chain.from_iterable(result))
-    return result
+    for from_type, to_type in zip(path[:-1], path[1:]):
+      hop_values, hop_offsets = self.__resolve_single_csr(from_type, to_type, values)
+      # the ids mapped from ids[i] start at the position the first intermediate value of ids[i] maps to
+      offsets = hop_offsets[offsets]
+      values = hop_values
+    return values, offsets
+
+  def __is_csr_edge(self, from_idtype, to_idtype):
+    to_mappings = self.mappers.get(from_idtype, {}).get(to_idtype, [])
+    return len(to_mappings) == 1 and getattr(to_mappings[0], 'csr_results', False)
+
+  def __resolve_single_csr(self, from_idtype, to_idtype, ids):
+    if self.__is_csr_edge(from_idtype, to_idtype):
+      start = time.monotonic()
+      values, offsets = self.mappers[from_idtype][to_idtype][0](_to_array(ids))
+      self.__observe(from_idtype, to_idtype, start)
+      return values, np.asarray(offsets, dtype=np.intp)
+    # keep the values of list based mappers as a flat list, since the next hop needs them as a list anyhow
+    return lists_to_csr(self.__resolve_single(from_idtype, to_idtype, _to_list(ids)), flat_list=True)
 
   def search(self, from_idtype, to_idtype, query, max_results=None):
     """
     Searches for matches in the names of the given idtype.
     This operation does not resolve transitive mappings.
+    If the search index is enabled, mappers that can enumerate their names via `search_keys()` are searched using
+    an in-memory index instead of calling their `search` method.
     :param query:
     :param max_results
     :return:
     """
     from_mappings = self.mappers.get(from_idtype, {})
     to_mappings = from_mappings.get(to_idtype, [])
-    to_mappings = [m for m in to_mappings if hasattr(m, 'search')]
+    to_mappings = [m for m in to_mappings if hasattr(m, 'search') or self.__is_indexed(m)]
 
     if not to_mappings:
       _log.warn('cannot find mapping from %s to %s', from_idtype, to_idtype)
       return []
 
+    def search_mapper(mapper):
+      if self.__is_indexed(mapper):
+        return self.__search_index(mapper).search(query, max_results)
+      return mapper.search(query, max_results)
+
     if len(to_mappings) == 1:
       # single mapping no need for merging
-      return to_mappings[0].search(query, max_results)
+      return search_mapper(to_mappings[0])
 
-    rset = set()
-    for mapper in to_mappings:
-      results = mapper.search(query, max_results)
-      for r in results:
-        rset.add(r)
-    return list(rset)
+    # merge the results in a deterministic order
+    results = list(OrderedDict.fromkeys(chain.from_iterable(search_mapper(mapper) for mapper in to_mappings)))
+    results.sort(key=rank_key(query))
+    return results if max_results is None else results[:max_results]
 
+  def __is_indexed(self, mapper):
+    return self._search_index_enabled and hasattr(mapper, 'search_keys')
 
-def create():
+  def __search_index(self, mapper):
+    """
+    returns the search index of the given mapper, which is (re)built if the version of the mapper changed.
+    A mapper can signal that its names changed by changing its optional `search_version` attribute.
+    """
+    version = getattr(mapper, 'search_version', None)
+    entry = self._search_indices.get(id(mapper))
+    if entry is None or entry[0] is not mapper or entry[1] != version:
+      _log.info('build search index of mapper %s', mapper)
+      entry = (mapper, version, SearchIndex(mapper.search_keys()))
+      self._search_indices[id(mapper)] = entry
+    return entry[2]
+
+
+def _create_cache():
+  cc = view('phovea_server.mapping.cache')
+  max_size = cc.getint('size', default=0)
+  if max_size <= 0:
+    return None
+  _log.info('enable mapping result cache with size %d', max_size)
+  return MappingCache(max_size, cc.getfloat('ttl', default=0))
+
+
+def _load_providers():
   # Load mapping providers
   providers = []
   for plugin in list_plugin('mapping_provider'):
     providers = providers + list(plugin.load().factory())
-  return MappingManager(providers)
+  return providers
+
+
+def _fingerprint(cc):
+  """
+  fingerprint of the registered mapping providers and the mapping configuration that influences the paths
+  """
+  import hashlib
+  import json
+  entries = []
+  for p in list_plugin('mapping_provider'):
+    plugin = getattr(p, 'plugin', None)
+    entries.append([p.id, getattr(p, 'module', ''), getattr(plugin, 'id', ''), str(getattr(plugin, 'version', ''))])
+  key = dict(version=SNAPSHOT_VERSION, providers=sorted(entries), concurrent=cc.getboolean('concurrent', default=False))
+  return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _read_snapshot(file_name, fingerprint):
+  import json
+  import os
+  if not os.path.exists(file_name):
+    return None
+  try:
+    with open(file_name, 'r', encoding='utf-8') as f:
+      snapshot = json.load(f)
+  except (OSError, ValueError) as e:
+    _log.warning('cannot read mapping snapshot %s: %s', file_name, e)
+    return None
+  if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('fingerprint') != fingerprint:
+    _log.info('mapping snapshot %s is outdated', file_name)
+    return None
+  return snapshot
+
+
+def _write_snapshot(file_name, snapshot):
+  import json
+  import os
+  import tempfile
+  directory = os.path.dirname(os.path.abspath(file_name))
+  try:
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+    # write to a temporary file first, such that concurrently starting workers never read a partial snapshot
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+      json.dump(snapshot, f)
+    os.replace(tmp_name, file_name)
+    _log.info('wrote mapping snapshot %s', file_name)
+  except OSError as e:
+    _log.warning('cannot write mapping snapshot %s: %s', file_name, e)
+
+
+def create():
+  cc = view('phovea_server.mapping')
+  kwargs = dict(cache=_create_cache(),
+                concurrent=cc.getboolean('concurrent', default=False),
+                timeout=cc.getfloat('timeout', default=0),
+                max_workers=cc.getint('max_workers', default=8),
+                search_index=cc.getboolean('search_index', default=False),
+                learn_costs=cc.getboolean('learn_costs', default=False))
+
+  if not cc.getboolean('snapshot', default=False):
+    return MappingManager(_load_providers(), **kwargs)
+
+  import os
+  file_name = os.path.join(view('phovea_server').get('dataDir'), SNAPSHOT_FILE_NAME)
+  fingerprint = _fingerprint(cc)
+
+  def write(manager):
+    _write_snapshot(file_name, manager.to_snapshot(fingerprint))
+
+  snapshot = _read_snapshot(file_name, fingerprint)
+  if snapshot is not None:
+    _log.info('restore mapping graph from snapshot %s', file_name)
+    return MappingManager.from_snapshot(snapshot, _load_providers, on_outdated=write, **kwargs)
+
+  manager = MappingManager(_load_providers(), **kwargs)
+  write(manager)
+  return manager
+
+
+def invalidate(idtype=None):
+  """
+  hook for mapping providers to invalidate the cached mapping results after their mapping tables changed
+  :param idtype: optional idtype whose mappings are affected, None to invalidate all
+  """
+  manager = lookup_plugin('mappingmanager')
+  if manager is not None:
+    manager.invalidate(idtype)
@@ -4,7 +4,7 @@
 # Licensed under the new BSD license, available at http://caleydo.org/license
 ###############################################################################
 
-from flask import Flask as Namespace, request, abort, make_response, Response, send_from_directory, safe_join, jsonify, render_template_string, send_file  # noqa
+from flask import Flask as Namespace, request, abort, make_response, Response, send_from_directory, safe_join, jsonify, render_template_string, send_file, stream_with_context  # noqa
 
 
 # based on https://github.com/miguelgrinberg/oreilly-flask-apis-video/blob/master/orders/app/decorators/caching.py
@@ -60,3 +60,35 @@ def etag(f):
     rv.add_etag()
     return rv.make_conditional(request)
   return wrapped
+
+
+def etag_version(get_version):
+  """Add entity tag (etag) handling based on a version of the resource. The
+  etag is derived from the version, such that neither the response has to be
+  generated nor its body has to be hashed if the client has a current copy.
+  get_version is called with the arguments of the route and returns a string
+  or None to fall back to the body based etag."""
+  import functools
+
+  def decorator(f):
+    @functools.wraps(f)
+    def wrapped(*args, **kwargs):
+      if request.method not in ['GET', 'HEAD']:
+        return f(*args, **kwargs)
+
+      version = get_version(*args, **kwargs)
+      if version is None:
+        return etag(f)(*args, **kwargs)
+
+      if request.if_none_match.contains(version):
+        rv = Response(status=304)
+        rv.set_etag(version)
+        return rv
+
+      rv = make_response(f(*args, **kwargs))
+      if rv.status_code == 200:
+        rv.set_etag(version)
+      return rv
+    return wrapped
+
+  return decorator
@@ -0,0 +1,95 @@
+###############################################################################
+# Caleydo - Visualization for Molecular Biology - http://caleydo.org
+# Copyright (c) The Caleydo Team. All rights reserved.
+# Licensed under the new BSD license, available at http://caleydo.org/license
+###############################################################################
+
+
+from builtins import object
+from bisect import bisect_left
+
+_NGRAM = 3
+
+
+def rank_key(query):
+  """
+  creates a sort key function ranking names for the given query: exact matches first, then prefix matches,
+  then substring matches and finally everything else. Within a rank names are sorted case insensitive.
+  """
+  q = (query or '').lower()
+
+  def key(name):
+    if not isinstance(name, str):
+      return 3, '', str(name)
+    lower = name.lower()
+    if lower == q:
+      rank = 0
+    elif lower.startswith(q):
+      rank = 1
+    elif q in lower:
+      rank = 2
+    else:
+      rank = 3
+    return rank, lower, name
+
+  return key
+
+
+class SearchIndex(object):
+  """
+  in-memory index of names supporting case insensitive prefix and substring searches.
+  The names are kept in a sorted array for prefix searches via binary search and a trigram index is used
+  to narrow down the candidates of substring searches.
+  """
+
+  def __init__(self, names=()):
+    unique = set(n for n in names if isinstance(n, str))
+    self._names = sorted(unique, key=lambda n: (n.lower(), n))
+    self._lower = [n.lower() for n in self._names]
+    self._ngrams = {}
+    for i, lower in enumerate(self._lower):
+      for gram in set(lower[j:j + _NGRAM] for j in range(len(lower) - _NGRAM + 1)):
+        # positions are appended in ascending order, such that each posting list is sorted
+        self._ngrams.setdefault(gram, []).append(i)
+
+  def __len__(self):
+    return len(self._names)
+
+  def _substring_candidates(self, q):
+    if len(q) < _NGRAM:
+      return range(len(self._lower))
+    postings = [self._ngrams.get(q[j:j + _NGRAM]) for j in range(len(q) - _NGRAM + 1)]
+    if not all(postings):
+      return []
+    # the shortest posting list contains all matches, which are verified afterwards
+    return min(postings, key=len)
+
+  def search(self, query, max_results=None):
+    """
+    searches for names containing the given query ignoring the case
+    :param query: the query string
+    :param max_results: optional maximal number of results
+    :return: list of names ranked by exact, prefix and substring matches and in alphabetical order within a rank
+    """
+    q = (query or '').lower()
+    limit = max_results if max_results is not None and max_results >= 0 else len(self._names)
+    if limit == 0 or not q:
+      return self._names[:limit]
+
+    # prefix matches form a consecutive range in the sorted array, starting with the exact matches
+    results = []
+    start = end = bisect_left(self._lower, q)
+    while end < len(self._lower) and self._lower[end].startswith(q):
+      results.append(end)
+      end += 1
+      if len(results) >= limit:
+        return [self._names[i] for i in results]
+
+    for i in self._substring_candidates(q):
+      if start <= i < end:
+        continue
+      if q in self._lower[i]:
+        results.append(i)
+        if len(results) >= limit:
+          break
+    return [self._names[i] for i in results]
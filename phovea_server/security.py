@@ -9,6 +9,10 @@ from builtins import str
 from builtins import object
 from . import plugin as p
 import sys
+import functools
+import logging
+
+_log = logging.getLogger(__name__)
 
 ANONYMOUS = 'anonymous'
 
@@ -134,20 +138,89 @@ def manager():
     _manager = p.lookup('security_manager')
     if _manager is None:
       _manager = DummyManager()
+    _invalidate_on(_manager, 'login')
+    _invalidate_on(_manager, 'logout')
   return _manager
 
 
+def _invalidate_on(m, method):
+  """
+  wraps the given method of the manager instance such that the request cache of the current user is invalidated
+  """
+  f = getattr(m, method)
+
+  @functools.wraps(f)
+  def wrapper(*args, **kwargs):
+    try:
+      return f(*args, **kwargs)
+    finally:
+      invalidate_user_cache()
+
+  setattr(m, method, wrapper)
+
+
+def _request_cache():
+  """
+  :return: the security cache of the current request stored on flask.g or None outside of a request
+  """
+  from flask import g, has_request_context
+  if not has_request_context():
+    return None
+  cache = g.get('_phovea_security')
+  if cache is None:
+    cache = g._phovea_security = dict(saved=0)
+  return cache
+
+
+def _manager_user():
+  """
+  :return: the current user of the security manager, resolved once per request
+  """
+  cache = _request_cache()
+  if cache is None:
+    return manager().current_user
+  if 'user' in cache:
+    cache['saved'] += 1
+    return cache['user']
+  user = cache['user'] = manager().current_user
+  return user
+
+
+def invalidate_user_cache():
+  """
+  drops the current user cached for the current request, e.g. after a login or logout
+  """
+  cache = _request_cache()
+  if cache is not None:
+    cache.pop('user', None)
+
+
+def saved_lookups():
+  """
+  :return: the number of security manager lookups of the current user saved within the current request
+  """
+  cache = _request_cache()
+  return cache['saved'] if cache is not None else 0
+
+
+def _log_saved_lookups(response):
+  saved = saved_lookups()
+  if saved > 0:
+    _log.debug('saved %d security manager lookups', saved)
+  return response
+
+
 def is_logged_in():
   return manager().is_authenticated()
 
 
 def current_username():
-  u = manager().current_user
+  u = _manager_user()
   return u.name if hasattr(u, 'name') else ANONYMOUS
 
 
 def current_user():
-  user = manager().current_user
+  user = _manager_user()
   if user.is_anonymous:
     return ANONYMOUS_USER
   return user
@@ -167,6 +240,7 @@ def init_app(app):
   :return:
   """
   manager().init_app(app)
+  app.after_request(_log_saved_lookups)
 
 
 def add_login_routes(app):
@@ -269,6 +343,67 @@ def can(item, permission, user=None):
   return permission in others
 
 
+class _PermissionCheck(object):
+  """
+  checks the permissions of many items for a single user, equivalent to `can`.
+  The names of the user are lowercased once and the decoded permission triples are cached per permission value.
+  """
+
+  def __init__(self, user):
+    self.name = user.name
+    self.lower_name = user.name.lower() if user.name else None
+    self.roles = set(r.lower() for r in user.roles if r)
+    self._decoded = {}
+
+  def _decode(self, permission):
+    decoded = self._decoded.get(permission)
+    if decoded is None:
+      decoded = self._decoded[permission] = _decode(permission)
+    return decoded
+
+  def _is_user(self, name):
+    return name == self.name or (bool(name) and self.lower_name is not None and name.lower() == self.lower_name)
+
+  def __call__(self, item, permission):
+    if isinstance(item, dict):
+      get = item.get
+      has_buddies, has_group = 'buddies' in item, 'group' in item
+    else:
+      def get(k, default=None):
+        return getattr(item, k, default)
+      has_buddies = has_group = True
+
+    owner, group, others, buddies = self._decode(get('permissions', DEFAULT_PERMISSION))
+
+    if permission in owner and self._is_user(get('creator', ANONYMOUS)):
+      return True
+
+    if permission in buddies and has_buddies and self.lower_name and \
+       any(b and b.lower() == self.lower_name for b in get('buddies', [])):
+      return True
+
+    if permission in group and has_group:
+      g = get('group', ANONYMOUS)
+      if g and g.lower() in self.roles:
+        return True
+
+    return permission in others
+
+
+def filter_readable(items, user=None, key=None):
+  """
+  filters the items the given user is allowed to read, resolving the user only once for all items
+  :param items: iterable of data descriptions (dicts or objects)
+  :param user: the user to check, by default the current user
+  :param key: optional function returning the data description of an item
+  :return: a generator of the readable items
+  """
+  check = _PermissionCheck(user if user is not None else current_user())
+  if key is None:
+    return (item for item in items if check(item, PERMISSION_READ))
+  return (item for item in items if check(key(item), PERMISSION_READ))
+
+
 def can_read(data_description, user=None):
   return can(data_description, PERMISSION_READ, user)
 
@@ -160,6 +160,11 @@ def _pre_load_caches():
     _log.info('initialize mapping manager')
     get_mappingmanager()
 
+  if c.get('dataset', False):
+    from .dataset import init_providers
+    _log.info('initialize dataset providers')
+    init_providers()
+
 
 def create_application():
   from . import dispatcher
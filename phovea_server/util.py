@@ -10,6 +10,29 @@ import json
 from typing import Union
 
 
+# the encoders of the json-encoder extension point, resolved on first use
+_encoders = None
+# type -> encoder which handled an object of this type
+_encoder_dispatch = {}
+
+
+def _encoder_chain():
+  global _encoders
+  if _encoders is None:
+    from .plugin import list as list_plugins
+    _encoders = [p.load().factory() for p in list_plugins('json-encoder')]
+  return _encoders
+
+
+def reset_encoders():
+  """
+  forgets the resolved json encoders, such that they are looked up again e.g. after the registry changed
+  """
+  global _encoders
+  _encoders = None
+  _encoder_dispatch.clear()
+
+
 class JSONExtensibleEncoder(json.JSONEncoder):
   """
   json encoder with extension point extensions
@@ -17,13 +40,16 @@ class JSONExtensibleEncoder(json.JSONEncoder):
 
   def __init__(self, *args, **kwargs):
     super(JSONExtensibleEncoder, self).__init__(*args, **kwargs)
-
-    from .plugin import list as list_plugins
-    self.encoders = [p.load().factory() for p in list_plugins('json-encoder')]
+    self.encoders = _encoder_chain()
 
   def default(self, o):
+    # the encoder of the last object of the same type is checked first
+    encoder = _encoder_dispatch.get(type(o))
+    if encoder is not None and o in encoder:
+      return encoder(o, self)
     for encoder in self.encoders:
       if o in encoder:
+        _encoder_dispatch[type(o)] = encoder
         return encoder(o, self)
     return super(JSONExtensibleEncoder, self).default(o)
 
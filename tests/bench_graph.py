@@ -0,0 +1,107 @@
+"""
+Memory benchmarks of the object based against the columnar graph storage and of the streamed graph json,
+run them from the repository root via:
+
+  python -m tests.bench_graph
+"""
+import gc
+import random
+import time
+import tracemalloc
+from phovea_server.graph import GraphNode, GraphEdge, IndexedGraph
+from phovea_server.columnar_graph import ColumnarGraph
+from phovea_server import graph_api, plugin
+from phovea_server.util import to_json
+
+
+def _synthetic_graph(n, m, attrs_every=10):
+  """
+  random graph with n nodes, m edges and attributes at every attrs_every-th element
+  """
+  rnd = random.Random(42)
+  types = ['entity', 'action', 'state']
+  nodes = [dict(id=i, type=types[i % 3], attrs=dict(name='n{0}'.format(i)) if i % attrs_every == 0 else {})
+           for i in range(n)]
+  edges = [dict(id=i, type='link', source=rnd.randrange(n), target=rnd.randrange(n),
+                attrs=dict(weight=i) if i % attrs_every == 0 else {}) for i in range(m)]
+  return nodes, edges
+
+
+def _object_graph(nodes, edges):
+  return IndexedGraph('g', 'bench', nodes=[GraphNode(n['type'], n['id'], n['attrs']) for n in nodes],
+                      edges=[GraphEdge(e['type'], e['id'], e['source'], e['target'], e['attrs']) for e in edges])
+
+
+def _columnar_graph(nodes, edges):
+  return ColumnarGraph('g', 'bench', nodes=nodes, edges=edges)
+
+
+def _measure(create, nodes, edges):
+  gc.collect()
+  tracemalloc.start()
+  start = time.time()
+  g = create(nodes, edges)
+  elapsed = time.time() - start
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  start = time.time()
+  for i in range(0, len(nodes), max(1, len(nodes) // 1000)):
+    list(g.outgoing_edges(g.get_node(i)))
+  lookup = time.time() - start
+  return size / 1024.0 / 1024.0, elapsed * 1000, lookup * 1000
+
+
+def _stream(g):
+  body = iter(graph_api.format_json(g, {}).response)
+  first = next(body) + next(body)
+  return first, body
+
+
+def _measure_json(g):
+  """
+  :return: tuple of the time to first byte (ms), total time (ms) and peak memory (MB) of the streamed
+  and the total time (ms) and peak memory (MB) of the buffered json of the graph
+  """
+  start = time.time()
+  _, body = _stream(g)
+  ttfb = time.time() - start
+  for _ in body:
+    pass
+  streamed = time.time() - start
+  start = time.time()
+  to_json(g.asjson())
+  buffered = time.time() - start
+
+  # measure the memory separately, since tracing slows down the encoding
+  gc.collect()
+  tracemalloc.start()
+  for _ in _stream(g)[1]:
+    pass
+  streamed_peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  gc.collect()
+  tracemalloc.start()
+  to_json(g.asjson())
+  buffered_peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  mb = 1024.0 * 1024.0
+  return ttfb * 1000, streamed * 1000, streamed_peak / mb, buffered * 1000, buffered_peak / mb
+
+
+def main():
+  print('graph storage: memory (MB), construction (ms), 1000 outgoing edge lookups incl. building the indices (ms)')
+  for n, m in [(10000, 50000), (100000, 500000)]:
+    nodes, edges = _synthetic_graph(n, m)
+    for name, create in [('objects', _object_graph), ('columnar', _columnar_graph)]:
+      mb, construct, lookup = _measure(create, nodes, edges)
+      print('  {:8s} {:7d} nodes {:7d} edges: {:8.1f} MB {:10.1f} ms {:8.1f} ms'.format(name, n, m, mb, construct, lookup))
+
+  plugin.list()  # loads the configuration
+  print('graph json: time to first byte (ms), streamed total (ms) and peak memory (MB), buffered total (ms) and peak memory (MB)')
+  for n, m in [(200000, 1000000)]:
+    g = _columnar_graph(*_synthetic_graph(n, m))
+    print('  {:7d} nodes {:7d} edges: {:6.1f} ms | {:8.1f} ms {:8.1f} MB | {:8.1f} ms {:8.1f} MB'.format(n, m, *_measure_json(g)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,44 @@
+"""
+Throughput benchmark of the graph formats, run it from the repository root via:
+
+  python -m tests.bench_graph_formats
+"""
+import io
+import time
+from werkzeug.datastructures import FileStorage
+from phovea_server import graph_api, graph_formats, graph_parser, plugin
+from tests.bench_graph import _synthetic_graph, _columnar_graph
+
+
+def _parse_json(args, files):
+  # the regular json upload passes the whole text as desc
+  return graph_parser.parse_json(dict(desc=files[0].stream.read().decode('utf-8')), [])
+
+
+_FORMATS = [
+    ('json', graph_api.format_json, _parse_json),
+    ('csv', graph_formats.format_csv, graph_formats.parse_csv),
+    ('graphml', graph_formats.format_graphml, graph_formats.parse_graphml),
+    ('npz', graph_formats.format_npz, graph_formats.parse_npz),
+]
+
+
+def main():
+  plugin.list()  # loads the configuration
+  print('graph formats: size (MB), format (ms), parse (ms), edges per second of formatting and parsing')
+  for n, m in [(50000, 250000)]:
+    g = _columnar_graph(*_synthetic_graph(n, m))
+    for name, format, parse in _FORMATS:
+      start = time.time()
+      data = format(g, {}).get_data()
+      formatted = time.time() - start
+      start = time.time()
+      parsed = parse({}, [FileStorage(io.BytesIO(data), filename='graph.' + name)])
+      parsed_time = time.time() - start
+      assert len(parsed['edges']) == m
+      print('  {:8s} {:6d} nodes {:7d} edges: {:7.1f} MB {:8.1f} ms {:8.1f} ms | {:9.0f} {:9.0f} edges/s'.format(
+          name, n, m, len(data) / 1024.0 / 1024.0, formatted * 1000, parsed_time * 1000, m / formatted, m / parsed_time))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,61 @@
+"""
+Micro benchmark of jsonify on typical API payloads with the former per call encoder lookup and the cached encoder
+chain, run it from the repository root via:
+
+  python -m tests.bench_json
+"""
+import json
+import timeit
+import datetime as dt
+import numpy as np
+from phovea_server import plugin, util
+
+
+class _UncachedEncoder(json.JSONEncoder):
+  # the former encoder resolving the encoders per instance and probing all of them for every object,
+  # numpy arrays were converted element by element
+  def __init__(self, *args, **kwargs):
+    super(_UncachedEncoder, self).__init__(*args, **kwargs)
+    self.encoders = [p.load().factory() for p in plugin.list('json-encoder')]
+
+  def default(self, o):
+    if isinstance(o, np.ndarray):
+      return [self.default(x) for x in o]
+    for encoder in self.encoders:
+      if o in encoder:
+        return encoder(o, self)
+    return super(_UncachedEncoder, self).default(o)
+
+
+def _payloads():
+  descs = [dict(id='dataset{}'.format(i), name='Dataset {}'.format(i), fqname='project/dataset{}'.format(i),
+                type='matrix', size=[100, 20], idtype='IDTypeA', coltype='IDTypeB',
+                value=dict(type='real', range=[0, 1])) for i in range(100)]
+  return [
+    ('small object', dict(id='dataset1', name='Dataset 1', size=[100, 20], rowids={1, 2, 3})),
+    ('dataset listing (100)', descs),
+    ('numpy table (1000x10)', np.random.RandomState(0).rand(1000, 10)),
+    ('numpy vector (10000)', np.arange(10000, dtype=np.int32)),
+    ('mixed rows (1000)', [dict(id=np.int64(i), created=dt.datetime(2020, 1, 1), tags={'a', 'b'}) for i in range(1000)]),
+  ]
+
+
+def _bench(payload, number):
+  return min(timeit.repeat(lambda: util.jsonify(payload), number=number, repeat=5)) / number * 1000
+
+
+def main():
+  plugin.list()
+  original = util.JSONExtensibleEncoder
+  print('jsonify: former encoder vs cached encoder chain with type dispatch')
+  for name, payload in _payloads():
+    number = 1000 if name == 'small object' else 10
+    util.JSONExtensibleEncoder = _UncachedEncoder
+    before = _bench(payload, number)
+    util.JSONExtensibleEncoder = original
+    after = _bench(payload, number)
+    print('  {:24s}: {:10.3f} ms before, {:10.3f} ms after ({:.1f}x)'.format(name, before, after, before / after))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,132 @@
+"""
+Micro benchmarks of the MappingManager, run them from the repository root via:
+
+  python -m tests.bench_mapper
+"""
+import random
+import timeit
+from itertools import chain
+import numpy as np
+from phovea_server.mapper import MappingManager
+from phovea_server.search_index import SearchIndex
+
+
+class _IdentityMappingTable(object):
+  preserves_order = True
+
+  def __call__(self, ids):
+    return [[id] for id in ids]
+
+
+class _OneToMoreMappingTable(object):
+  preserves_order = True
+
+  def __call__(self, ids):
+    return [[id, id + 1, id + 2] for id in ids]
+
+
+class _CSROneToMoreMappingTable(object):
+  csr_results = True
+
+  def __call__(self, ids):
+    ids = ids.astype(np.int64)
+    return np.stack([ids, ids + 1, ids + 2], axis=1).ravel(), np.arange(0, len(ids) * 3 + 1, 3)
+
+
+def _nested_list_mapping(manager, path, ids):
+  # the former nested list pipeline using merge_2d_arrays
+  values = ids
+  needs_merging = False
+  lengths = []
+  for i in range(1, len(path)):
+    mapper = manager.mappers[path[i - 1]][path[i]][0]
+    result = mapper(values)
+    if needs_merging:
+      result = manager.merge_2d_arrays(result, lengths)
+    if i == len(path) - 1:
+      return result
+    lengths = [len(x) for x in result]
+    needs_merging = max(lengths, default=0) > 1
+    values = list(chain.from_iterable(result))
+  return result
+
+
+def _synthetic_providers(n, degree=3, seed=0):
+  """
+  a bidirectional ring of n idtypes with degree additional random shortcuts per idtype
+  """
+  rnd = random.Random(seed)
+  idtypes = ['IDType{}'.format(i) for i in range(n)]
+  edges = set()
+  for i, a in enumerate(idtypes):
+    b = idtypes[(i + 1) % n]
+    edges.add((a, b))
+    edges.add((b, a))
+    for c in rnd.sample(idtypes, degree):
+      if c != a:
+        edges.add((a, c))
+  return [(a, b, _IdentityMappingTable()) for a, b in sorted(edges)]
+
+
+def _all_paths(graph, start, end, path=[]):
+  # the former exhaustive path enumeration of the MappingManager
+  path = path + [start]
+  if start == end:
+    return [path]
+  paths = []
+  for node in graph.get(start, []):
+    if node not in path:
+      paths.extend(_all_paths(graph, node, end, path))
+  return sorted(paths, key=len)
+
+
+def _exhaustive_init(providers):
+  graph = {}
+  for a, b, _ in providers:
+    graph.setdefault(a, []).append(b)
+  entries = set(graph.keys())
+  return {a: {b: _all_paths(graph, a, b) for b in entries if b != a} for a in entries}
+
+
+def _lazy_init(providers):
+  # construct the manager and resolve the whole path table, i.e. the work the exhaustive variant did eagerly
+  m = MappingManager(providers)
+  return {a: m.maps_to(a) for a in m.known_idtypes()}
+
+
+def _bench(f, providers, number=3):
+  return min(timeit.repeat(lambda: f(providers), number=1, repeat=number)) * 1000
+
+
+def main():
+  print('exhaustive all-paths initialization (sparse ring graph, degree 1)')
+  for n in [6, 7, 8, 9, 10]:
+    print('  {:4d} idtypes: {:10.2f} ms'.format(n, _bench(_exhaustive_init, _synthetic_providers(n, degree=1), number=1)))
+
+  print('lazy shortest-path index, full path table (degree 3)')
+  for n in [50, 100, 150, 200]:
+    providers = _synthetic_providers(n)
+    print('  {:4d} idtypes: {:10.2f} ms construction, {:10.2f} ms all paths'.format(
+      n, _bench(MappingManager, providers), _bench(_lazy_init, providers)))
+
+  path = ['A', 'B', 'C', 'D']
+  lists = MappingManager([(a, b, _OneToMoreMappingTable()) for a, b in zip(path[:-1], path[1:])])
+  csr = MappingManager([(a, b, _CSROneToMoreMappingTable()) for a, b in zip(path[:-1], path[1:])])
+  print('3-hop one-to-three mapping')
+  for n in [10000, 100000]:
+    ids = list(range(n))
+    print('  {:7d} ids: {:10.2f} ms nested lists, {:10.2f} ms list mappers, {:10.2f} ms csr mappers, {:10.2f} ms csr mappers without nesting'.format(
+      n, _bench(lambda x: _nested_list_mapping(lists, path, x), ids), _bench(lambda x: lists('A', 'D', x), ids),
+      _bench(lambda x: csr('A', 'D', x), ids), _bench(lambda x: csr.map_csr('A', 'D', x), ids)))
+
+  rnd = random.Random(0)
+  names = ['{}{}{}'.format(rnd.choice(['TP', 'BRCA', 'ENSG', 'KRAS', 'MYC']), rnd.randint(0, 999999), rnd.choice(['', 'A', 'BP1'])) for _ in range(500000)]
+  start = timeit.default_timer()
+  index = SearchIndex(names)
+  print('search index of {} names, built in {:.2f} ms'.format(len(index), (timeit.default_timer() - start) * 1000))
+  for query in ['tp', 'brca12', '4242', 'bp1']:
+    print('  query {:>8s}: {:10.3f} ms'.format(query, _bench(lambda q: index.search(q, 10), query, number=10)))
+
+
+if __name__ == '__main__':
+  main()
@@ -21,3 +21,31 @@ class TestCustomEncoders:
     assert test_result_simple == '{"myNum": null}'
     assert test_result_list_simple == '{"myNum": [13, 5, 7, 12, null, 22]}'
     assert test_result_list_nested == '{"myNum": [13, 5, 7, 12, {"first": [4, 6, 2, null], "second": 3, "third": [null, 3, 78, 6, 3, 2]}, 22]}'
+
+  def test_extension_encoders(self):
+    import numpy as np
+    assert to_json(dict(a=np.int64(3), b=np.array([1.5, np.nan]), c={2})) == '{"a": 3, "b": [1.5, null], "c": [2]}'
+
+  def test_encoders_resolved_once(self, monkeypatch):
+    from phovea_server import util, plugin
+    plugin.list()
+    calls = []
+    original = plugin.list
+
+    def counting_list(*args):
+      calls.append(args)
+      return original(*args)
+
+    util.reset_encoders()
+    monkeypatch.setattr(plugin, 'list', counting_list)
+    for _ in range(3):
+      assert to_json([{1}, {2}]) == '[[1], [2]]'
+    assert calls == [('json-encoder',)]
+    assert set in util._encoder_dispatch
+
+  def test_numpy_arrays(self):
+    import numpy as np
+    assert to_json(np.array([[1.0, np.nan], [np.inf, 2.5]])) == '[[1.0, null], [Infinity, 2.5]]'
+    assert to_json(np.arange(3, dtype=np.uint8)) == '[0, 1, 2]'
+    assert to_json(np.array([True, False])) == '[true, false]'
+    assert to_json(np.array(['a', 'b'])) == '["a", "b"]'
@@ -0,0 +1,256 @@
+import pytest
+from phovea_server import dataset
+from phovea_server.dataset_def import ADataSetEntry, ADataSetProvider
+from phovea_server.dataset_index import DataSetIndex
+
+
+class Entry(ADataSetEntry):
+  local_changes = True
+
+  def __init__(self, name, project='project', type='table', idtypes=None):
+    super(Entry, self).__init__(name, project, type)
+    self._idtypes = idtypes or []
+
+  def idtypes(self):
+    return self._idtypes
+
+  def asjson(self):
+    return dict()
+
+  def update(self, args, files):
+    self.name = args.get('name', self.name)
+    self.fqname = 'project/' + self.name
+    return True
+
+
+class Provider(ADataSetProvider):
+  fires_change_events = True
+
+  def __init__(self, entries):
+    self.entries = entries
+    self.lookups = 0
+
+  def __iter__(self):
+    return iter(self.entries)
+
+  def __getitem__(self, dataset_id):
+    self.lookups += 1
+    return super(Provider, self).__getitem__(dataset_id)
+
+  def upload(self, data, files, id=None):
+    e = Entry(data['name'])
+    self.entries.append(e)
+    return e
+
+  def remove(self, entry):
+    if entry in self.entries:
+      self.entries.remove(entry)
+      return True
+    return False
+
+
+@pytest.fixture
+def providers(monkeypatch):
+  providers = [Provider([Entry('a', idtypes=['Gene']), Entry('b', idtypes=['Gene', 'Sample'])]), Provider([Entry('c', type='matrix')])]
+  monkeypatch.setattr(dataset, '_providers_r', providers)
+  monkeypatch.setattr(dataset, '_index', DataSetIndex())
+  for p in providers:
+    p.add_change_listener(dataset._on_provider_change)
+  return providers
+
+
+def test_get(providers):
+  assert [d.id for d in dataset.list_datasets()] == ['projectA', 'projectB', 'projectC']
+  assert dataset.get('projectC') is providers[1].entries[0]
+  # hits are served by the index
+  assert providers[0].lookups == providers[1].lookups == 0
+  # misses fall back to a scan
+  assert dataset.get('unknown') is None
+  assert providers[0].lookups == providers[1].lookups == 1
+
+
+def test_get_fallback(providers):
+  dataset.list_datasets()
+  # added behind the back of the index without an event
+  e = Entry('d')
+  providers[1].entries.append(e)
+  assert dataset.get('projectD') is e
+  assert providers[1].lookups == 1
+  assert dataset.get('projectD') is e
+  assert providers[1].lookups == 1
+
+
+def test_add_update_remove(providers):
+  e = dataset.add(dict(name='d'))
+  assert dataset.get('projectD') is e
+  assert dataset.update(e, dict(name='e'))
+  assert dataset.remove('projectD')
+  assert dataset.get('projectD') is None
+  assert [d.id for d in dataset.list_datasets()] == ['projectA', 'projectB', 'projectC']
+
+
+def test_change_events(providers):
+  dataset.list_datasets()
+  e = Entry('d')
+  providers[0].entries.append(e)
+  providers[0].fire_change('add', e)
+  assert [d.id for d in dataset.list_datasets()] == ['projectA', 'projectB', 'projectC', 'projectD']
+  providers[0].entries.remove(e)
+  providers[0].fire_change('remove', e)
+  assert 'projectD' not in dataset._index
+  providers[1].entries = [Entry('x')]
+  providers[1].fire_change('reset')
+  assert [d.id for d in dataset.list_datasets()] == ['projectA', 'projectB', 'projectX']
+
+
+class LiveProvider(Provider):
+  fires_change_events = False
+
+
+def test_live_provider(providers, monkeypatch):
+  live = LiveProvider([Entry('x')])
+  monkeypatch.setattr(dataset, '_providers_r', providers + [live])
+  assert [d.id for d in dataset.iter()] == ['projectA', 'projectB', 'projectC', 'projectX']
+  # changed e.g. by another process without any event
+  y = Entry('y', type='matrix')
+  live.entries = [y]
+  assert [d.id for d in dataset.iter()] == ['projectA', 'projectB', 'projectC', 'projectY']
+  assert dataset.get('projectX') is None
+  assert dataset.get('projectY') is y
+  assert dataset.get('projectY') is y
+  assert live.lookups == 3
+  assert 'projectY' not in dataset._index
+  assert dataset.count() == 4
+  assert [d.id for d in dataset.find(type='matrix')] == ['projectC', 'projectY']
+  assert dataset.list_idtypes_version() is None
+
+
+class Mapping(object):
+  def __init__(self, idtypes):
+    self.idtypes = idtypes
+
+  def known_idtypes(self):
+    return set(self.idtypes)
+
+
+def test_list_idtypes(providers, monkeypatch):
+  mapping = Mapping(['Gene', 'Tissue'])
+  monkeypatch.setattr(dataset, 'get_mappingmanager', lambda: mapping)
+  assert [d['id'] for d in dataset.list_idtypes()] == ['Gene', 'Sample', 'Tissue']
+  assert dataset.list_idtypes()[1] == dict(id='Sample', name='Sample', names='Samples')
+  version = dataset.list_idtypes_version()
+  assert dataset.list_idtypes_version() == version
+
+  # removing a dataset that shares its idtypes with others does not change the catalog
+  assert dataset.remove('projectA')
+  assert dataset.list_idtypes_version() == version
+  assert dataset.remove('projectB')
+  assert dataset.list_idtypes_version() != version
+  assert [d['id'] for d in dataset.list_idtypes()] == ['Gene', 'Tissue']
+
+  version = dataset.list_idtypes_version()
+  mapping.idtypes = ['Tissue']
+  assert dataset.list_idtypes_version() != version
+  assert [d['id'] for d in dataset.list_idtypes()] == ['Tissue']
+
+
+def test_find(providers):
+  assert [d.id for d in dataset.find(type='table')] == ['projectA', 'projectB']
+  assert [d.id for d in dataset.find(fqname='project/c')] == ['projectC']
+  assert [d.id for d in dataset.find(id='project', type='mat')] == ['projectC']
+  assert dataset.find() is None
+
+  a = providers[0].entries[0]
+  dataset.update(a, dict(name='z'))
+  assert dataset.find(fqname='project/a') == []
+  assert dataset.find(fqname='project/z') == [a]
+  dataset.remove(a)
+  assert [d.id for d in dataset.find(type='table')] == ['projectB']
+
+
+class ProviderPlugin(object):
+  def __init__(self, id, provider, ready=None):
+    self.id = id
+    self.provider = provider
+    self.ready = ready
+    self.calls = 0
+
+  def load(self):
+    return self
+
+  def factory(self):
+    self.calls += 1
+    if self.ready is not None:
+      self.ready.wait(5)
+    if isinstance(self.provider, Exception):
+      raise self.provider
+    return self.provider
+
+
+@pytest.fixture
+def loading(monkeypatch):
+  from phovea_server.config import view
+  import threading
+  ready = threading.Event()
+  fast, slow = Provider([Entry('a')]), Provider([Entry('b')])
+  plugins = [ProviderPlugin('slow', slow, ready), ProviderPlugin('fast', fast)]
+  monkeypatch.setattr(dataset.phovea_server.plugin, 'list', lambda plugin_type=None: plugins)
+  monkeypatch.setattr(dataset, '_providers_r', None)
+  monkeypatch.setattr(dataset, '_provider_futures', None)
+  monkeypatch.setattr(dataset, '_failed_plugins', [])
+  monkeypatch.setattr(dataset, '_index', DataSetIndex())
+  cc = view('phovea_server.dataset')
+  old = cc.getboolean('skip_loading')
+  cc.set('skip_loading', True)
+  yield ready, fast, slow, plugins
+  ready.set()
+  cc.set('skip_loading', old)
+
+
+def test_parallel_init(loading):
+  ready, fast, slow, _ = loading
+  dataset.init_providers(parallel=True)
+  for f in dataset._provider_futures:
+    if f is not dataset._provider_futures[0]:
+      f.result(5)
+  # the slow provider is skipped while it is loading
+  assert [d.id for d in dataset.iter()] == ['projectA']
+  ready.set()
+  dataset._provider_futures[0].result(5)
+  assert sorted(d.id for d in dataset.iter()) == ['projectA', 'projectB']
+  assert dataset._providers() == [slow, fast]
+  assert set(dataset.provider_init_times()) >= {'slow', 'fast'}
+
+
+def test_failing_provider(loading, monkeypatch):
+  ready, fast, slow, plugins = loading
+  ready.set()
+  broken = ProviderPlugin('broken', RuntimeError('connection refused'))
+  plugins.insert(0, broken)
+  dataset.init_providers(parallel=True)
+  for f in dataset._provider_futures:
+    f.exception(5)
+  # the broken provider is skipped instead of failing every lookup
+  assert sorted(d.id for d in dataset.iter()) == ['projectA', 'projectB']
+  assert dataset.get('projectA') is fast.entries[0]
+  assert dataset._failed_plugins == [broken]
+  assert broken.calls == 1
+
+  # and retried after the retry interval
+  working = Provider([Entry('c')])
+  broken.provider = working
+  dataset._providers()
+  assert broken.calls == 1
+  monkeypatch.setattr(dataset, '_failed_retry', 0)
+  assert dataset._providers() == [slow, fast, working]
+  assert broken.calls == 2
+  assert dataset._failed_plugins == []
+  assert dataset.get('projectC') is working.entries[0]
+
+
+def test_description_invalidation(providers):
+  a = providers[0].entries[0]
+  desc = a.description()
+  assert a.description() is desc
+  dataset.update(a, dict(name='z'))
+  assert a.description()['name'] == 'z'
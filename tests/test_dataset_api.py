@@ -0,0 +1,167 @@
+import pytest
+from phovea_server import dataset_api
+from phovea_server.dataset_def import ADataSetEntry
+from phovea_server.dataset_index import DataSetIndex
+from phovea_server.mapper import MappingManager
+
+
+class SuffixMappingTable(object):
+  preserves_order = True
+
+  def __call__(self, ids):
+    return [[id + 'x', id + 'y'] if id != 'none' else [] for id in ids]
+
+
+@pytest.fixture
+def idtype_client(monkeypatch):
+  mapper = MappingManager([('A', 'B', SuffixMappingTable())])
+  monkeypatch.setattr(dataset_api, 'get_mappingmanager', lambda: mapper)
+  return dataset_api.create_idtype().test_client()
+
+
+def test_mapping(idtype_client):
+  r = idtype_client.get('/A/B?q=a,none,c')
+  assert r.get_json() == [['ax', 'ay'], [], ['cx', 'cy']]
+  assert r.headers['X-Mapping-Path'] == 'A,B'
+  r = idtype_client.get('/A/B?q=a,none,c&mode=first')
+  assert r.get_json() == ['ax', None, 'cx']
+
+
+@pytest.fixture
+def small_chunks():
+  from phovea_server.config import view
+  cc = view('phovea_server.mapping')
+  old = cc.getint('stream_chunk_size')
+  cc.set('stream_chunk_size', 2)
+  yield
+  cc.set('stream_chunk_size', old)
+
+
+def test_streamed_mapping(idtype_client, small_chunks):
+  names = ['a', 'none', 'c', 'd', 'e']
+  expected = idtype_client.post('/A/B', data={'q[]': names}).get_data()
+  r = idtype_client.post('/A/B', data={'q[]': names, 'stream': 'true'})
+  assert r.is_streamed
+  assert r.get_data() == expected
+
+  r = idtype_client.get('/A/B?q=a,none&format=ndjson&mode=first')
+  assert r.mimetype == 'application/x-ndjson'
+  assert r.get_data(as_text=True) == '"ax"\nnull\n'
+  assert idtype_client.get('/A/B?q=a&format=xml').status_code == 400
+
+
+def test_list_idtypes_etag(monkeypatch):
+  catalog = dict(version='1', calls=0)
+
+  def list_idtypes():
+    catalog['calls'] += 1
+    return [dict(id='Gene', name='Gene', names='Genes')]
+
+  monkeypatch.setattr(dataset_api, 'list_idtypes', list_idtypes)
+  monkeypatch.setattr(dataset_api, 'list_idtypes_version', lambda: catalog['version'])
+  client = dataset_api.create_idtype().test_client()
+  r = client.get('/')
+  assert r.status_code == 200
+  assert r.get_json() == [dict(id='Gene', name='Gene', names='Genes')]
+  etag = r.headers['ETag']
+  r = client.get('/', headers={'If-None-Match': etag})
+  assert r.status_code == 304
+  assert catalog['calls'] == 1
+  catalog['version'] = '2'
+  assert client.get('/', headers={'If-None-Match': etag}).status_code == 200
+
+
+class Desc(ADataSetEntry):
+  local_changes = True
+
+  def __init__(self, id, type='table', project='p'):
+    super(Desc, self).__init__(id, project, type, id)
+    self.described = 0
+    self.permissions = {}
+
+  def asjson(self):
+    return dict()
+
+  def to_description(self):
+    self.described += 1
+    return dict(id=self.id, type=self.type, name=self.name, fqname=self.fqname, **self.permissions)
+
+
+@pytest.fixture
+def dataset_client(monkeypatch):
+  entries = [Desc('d{0}'.format(i), 'matrix' if i % 2 else 'table', 'p' if i < 4 else 'q') for i in range(5)]
+  index = DataSetIndex()
+  for e in entries:
+    index.add(None, e)
+  monkeypatch.setattr(dataset_api, 'iter', index.__iter__)
+  monkeypatch.setattr(dataset_api, 'count', index.__len__)
+  monkeypatch.setattr(dataset_api, 'find', index.find)
+  return dataset_api.create_dataset().test_client(), entries
+
+
+def test_list_datasets_paginated(dataset_client):
+  client, entries = dataset_client
+  r = client.get('/?limit=2')
+  assert [d['id'] for d in r.get_json()] == ['d0', 'd1']
+  assert r.headers['X-Total-Count'] == '5'
+  # only the entries of the page are described
+  assert [e.described for e in entries] == [1, 1, 0, 0, 0]
+  # the descriptions are memoized across requests
+  client.get('/?limit=2')
+  assert [e.described for e in entries] == [1, 1, 0, 0, 0]
+
+  r = client.get('/?limit=2&cursor=' + r.headers['X-Next-Cursor'])
+  assert [d['id'] for d in r.get_json()] == ['d2', 'd3']
+  r = client.get('/?limit=2&cursor=' + r.headers['X-Next-Cursor'])
+  assert [d['id'] for d in r.get_json()] == ['d4']
+  assert 'X-Next-Cursor' not in r.headers
+
+  r = client.get('/?type=matrix&offset=1')
+  assert [d['id'] for d in r.get_json()] == ['d3']
+  assert r.headers['X-Total-Count'] == '2'
+
+  r = client.get('/')
+  assert len(r.get_json()) == 5
+  assert 'X-Total-Count' not in r.headers
+  assert client.get('/?cursor=invalid').status_code == 400
+  assert client.get('/?limit=abc').status_code == 400
+
+
+def test_list_datasets_filter(dataset_client, monkeypatch):
+  client, entries = dataset_client
+  assert [d['id'] for d in client.get('/?type=matrix&fqname=p/').get_json()] == ['d1', 'd3']
+  assert [d['id'] for d in client.get('/?type=table&fqname=q').get_json()] == ['d4']
+  assert [d['id'] for d in client.get('/?id=d[0-2]&type=table').get_json()] == ['d0', 'd2']
+  assert client.get('/?id=d[').status_code == 400
+
+  # literal prefixes are served by the index without scanning all datasets
+  monkeypatch.setattr(dataset_api, 'iter', None)
+  assert [d['id'] for d in client.get('/?id=d3').get_json()] == ['d3']
+
+
+def test_list_datasets_treejson(monkeypatch):
+  entries = [Desc('x', project='p'), Desc('y', project='p/x')]
+  monkeypatch.setattr(dataset_api, 'iter', entries.__iter__)
+  client = dataset_api.create_dataset().test_client()
+  tree = client.get('/?format=treejson').get_json()
+  assert tree['p']['x']['y']['id'] == 'y'
+  # the shared descriptions are not modified
+  assert 'y' not in entries[0].description()
+
+
+def test_list_datasets_readable(dataset_client, monkeypatch):
+  client, entries = dataset_client
+  entries[1].permissions = dict(creator='someone', permissions=700)
+  entries[1].invalidate_description()
+  assert [d['id'] for d in client.get('/?limit=2').get_json()] == ['d0', 'd1']
+
+  monkeypatch.setattr(dataset_api, '_hide_unreadable', lambda: True)
+  r = client.get('/?limit=2')
+  assert [d['id'] for d in r.get_json()] == ['d0', 'd2']
+  # the total is an upper bound of the readable datasets
+  assert r.headers['X-Total-Count'] == '5'
+  # the entries up to the end of the page and the peeked one are checked
+  assert [e.described for e in entries] == [1, 1, 1, 1, 0]
+  r = client.get('/?limit=2&cursor=' + r.headers['X-Next-Cursor'])
+  assert [d['id'] for d in r.get_json()] == ['d3', 'd4']
+  assert 'X-Next-Cursor' not in r.headers
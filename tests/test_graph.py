@@ -0,0 +1,194 @@
+from phovea_server.graph import AGraph, GraphNode, GraphEdge, IndexedGraph
+from phovea_server.columnar_graph import ColumnarGraph
+
+
+class ListGraph(AGraph):
+  local_changes = True
+
+  def __init__(self):
+    super(ListGraph, self).__init__('g', 'project')
+    self._nodes = []
+    self._edges = []
+    self.counted = 0
+
+  def nodes(self):
+    self.counted += 1
+    return self._nodes
+
+  def edges(self):
+    self.counted += 1
+    return self._edges
+
+  def add_node(self, data):
+    self._nodes.append(GraphNode(data.get('type', 'node'), data['id'], data.get('attrs')))
+    return True
+
+  def remove_node(self, id):
+    n, m = len(self._nodes), len(self._edges)
+    self._nodes = [x for x in self._nodes if x.id != id]
+    self._edges = [e for e in self._edges if e.source != id and e.target != id]
+    self.report_removed_edges(m - len(self._edges))
+    return len(self._nodes) < n
+
+  def add_edge(self, data):
+    self._edges.append(GraphEdge(data.get('type', 'edge'), data['id'], data['source'], data['target'], data.get('attrs')))
+    return True
+
+  def clear(self):
+    self._nodes = []
+    self._edges = []
+    return True
+
+
+class LoggingGraph(ListGraph):
+  def add_node(self, data):
+    # nested calls are only counted once
+    return super(LoggingGraph, self).add_node(data)
+
+
+def test_size_counters():
+  g = LoggingGraph()
+  assert g.description()['size'] == [0, 0]
+  for i in range(3):
+    g.add_node(dict(id=i))
+  g.add_edge(dict(id=0, source=0, target=1))
+  g.add_edge(dict(id=1, source=1, target=2))
+  counted = g.counted
+  assert g.description()['size'] == [3, 2]
+  assert g.counted == counted
+  assert g.description() is g.description()
+
+  assert not g.remove_node(42)
+  assert g.remove_node(0)
+  assert g.description()['size'] == [2, 1]
+  # the removed edges are reported instead of counting all edges again
+  assert g.counted == counted
+  g.clear()
+  assert [g.nnodes, g.nedges] == [0, 0]
+
+
+class StoreGraph(ListGraph):
+  # e.g. backed by a database shared with other processes
+  local_changes = False
+
+
+def test_shared_store():
+  g = StoreGraph()
+  g.add_node(dict(id=0))
+  assert g.description()['size'] == [1, 0]
+  # changed by another process
+  g._nodes.append(GraphNode('node', 1))
+  assert g.description()['size'] == [2, 0]
+  assert g.nnodes == 2
+  assert g.description() is not g.description()
+
+
+class IndexedListGraph(ListGraph):
+  use_index = True
+
+
+def _fill(g):
+  for i in range(4):
+    g.add_node(dict(id=i))
+  for i, (s, t) in enumerate([(0, 1), (0, 2), (1, 2), (2, 3)]):
+    g.add_edge(dict(id=i, source=s, target=t))
+  return g
+
+
+def test_indexed_lookups():
+  plain, indexed, opt_in = _fill(ListGraph()), _fill(IndexedGraph('g', 'project')), _fill(IndexedListGraph())
+  columnar = _fill(ColumnarGraph('g', 'project'))
+  assert plain.graph_index is None
+  for g in (indexed, opt_in, columnar):
+    assert g.get_node(2).id == plain.get_node(2).id
+    assert g.get_edge(3).target == 3
+    assert g.get_node(42) is None
+    for n in plain.nodes():
+      assert [e.id for e in g.incoming_edges(n)] == [e.id for e in plain.incoming_edges(n)]
+      assert [e.id for e in g.outgoing_edges(n)] == [e.id for e in plain.outgoing_edges(n)]
+    assert [(e.id, s.id, t.id) for e, s, t in g.resolve_edges(g.edges())] == [(0, 0, 1), (1, 0, 2), (2, 1, 2), (3, 2, 3)]
+
+  # the lazily built index of opt-in graphs is rebuilt after changes
+  opt_in.add_edge(dict(id=4, source=3, target=0))
+  assert [e.id for e in opt_in.incoming_edges(opt_in.get_node(0))] == [4]
+
+
+def test_indexed_graph():
+  g = _fill(IndexedGraph('g', 'project'))
+  assert not g.add_node(dict(id=0))
+  assert not g.add_edge(dict(id=9, source=0, target=42))
+  assert g.update_edge(dict(id=0, target=3))
+  assert sorted(e.id for e in g.incoming_edges(g.get_node(3))) == [0, 3]
+  assert list(g.incoming_edges(g.get_node(1))) == []
+  assert g.remove_node(2)
+  assert sorted(e.id for e in g.edges()) == [0]
+  assert g.description()['size'] == [3, 1]
+  assert g.remove_edge(0) and not g.remove_edge(0)
+  g.clear()
+  assert g.description()['size'] == [0, 0]
+
+
+def test_indexed_graph_self_loop():
+  g = _fill(IndexedGraph('g', 'project'))
+  assert g.add_edge(dict(id=5, source=3, target=3))
+  assert sorted(e.id for e in g.graph_index.remove_node(3)[1]) == [3, 5]
+  g = _fill(IndexedGraph('g', 'project'))
+  g.add_edge(dict(id=5, source=3, target=3))
+  assert g.remove_node(3)
+  assert g.description()['size'] == [3, 3]
+
+
+def test_columnar_graph():
+  nodes = [dict(id=i, type='a' if i % 2 else 'b', attrs=dict(x=i) if i < 2 else {}) for i in range(5)]
+  edges = [dict(id=10 + i, type='e', source=i, target=(i + 1) % 5, attrs=dict(w=i) if i == 3 else None) for i in range(5)]
+  g = ColumnarGraph('g', 'project', nodes=nodes, edges=edges)
+  expected = IndexedGraph('g', 'project', nodes=[GraphNode(n['type'], n['id'], n['attrs']) for n in nodes],
+                          edges=[GraphEdge(e['type'], e['id'], e['source'], e['target'], e['attrs'] or {}) for e in edges])
+  assert g.asjson() == expected.asjson()
+  assert [n.asjson() for n in g.nodes()] == expected.asjson()['nodes']
+  assert g.nodes()[-1].id == 4 and len(g.edges()) == 5
+
+  assert g.add_node(dict(id='5', type='c', attrs=dict(y=1)))
+  assert not g.add_node(dict(id=5))
+  assert g.get_node('5').asjson() == dict(type='c', id=5, attrs=dict(y=1))
+  assert g.add_edge(dict(id=20, source=5, target=0))
+  assert not g.add_edge(dict(id=21, source=5, target=42))
+  assert [e.id for e in g.incoming_edges(g.get_node(0))] == [14, 20]
+
+  assert g.update_edge(dict(id=20, target=1, attrs=dict(w=9)))
+  assert g.get_edge(20).asjson() == dict(type='edge', id=20, source=5, target=1, attrs=dict(w=9))
+  assert g.update_node(dict(id=0, attrs={}))
+  assert g.get_node(0).attrs == {}
+
+  assert g.remove_node(1)
+  assert sorted(e.id for e in g.edges()) == [12, 13, 14]
+  assert g.description()['size'] == [5, 3]
+  assert g.remove_edge(13) and g.get_edge(13) is None and g.get_edge(12).target == 3
+  g.clear()
+  assert g.description()['size'] == [0, 0]
+
+
+class TransactionGraph(ListGraph):
+  def apply_batch(self, operations):
+    # e.g. a single database transaction bypassing the item methods
+    results = []
+    for o in operations:
+      known = any(n.id == o['data']['id'] for n in self._nodes)
+      if not known:
+        self._nodes.append(GraphNode('node', o['data']['id']))
+      results.append('failed' if known else 'ok')
+    return results
+
+
+def test_apply_batch():
+  g = _fill(ListGraph())
+  assert g.apply_batch([dict(op='remove', type='node', id=3), dict(op='add', type='edge', data=dict(id=9, source=0, target=1))]) == ['ok', 'ok']
+  assert g.description()['size'] == [3, 4]
+
+  g = _fill(TransactionGraph())
+  assert g.description()['size'] == [4, 4]
+  counted = g.counted
+  assert g.apply_batch([dict(op='add', type='node', data=dict(id=5)), dict(op='add', type='node', data=dict(id=0))]) == ['ok', 'failed']
+  # the counters are updated from the statuses instead of counting again
+  assert g.description()['size'] == [5, 4]
+  assert g.counted == counted
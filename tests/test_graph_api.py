@@ -0,0 +1,193 @@
+import pytest
+from flask import Flask, abort as flask_abort
+from phovea_server import graph_api, plugin
+from phovea_server.graph import IndexedGraph, GraphNode, GraphEdge
+
+
+@pytest.fixture(autouse=True)
+def registry():
+  # loads the plugin registry together with the configuration
+  plugin.list()
+
+
+@pytest.fixture(params=['indexed', 'columnar'])
+def graph_client(request):
+  from phovea_server.columnar_graph import ColumnarGraph
+  # 0 -> 1 -> 2 -> 3 and 0 -> 4 (type other)
+  nodes = [GraphNode('node', i) for i in range(5)]
+  edges = [GraphEdge('link', i, i, i + 1) for i in range(3)] + [GraphEdge('other', 3, 0, 4)]
+  if request.param == 'indexed':
+    g = IndexedGraph('g', 'project', nodes=nodes, edges=edges)
+  else:
+    g = ColumnarGraph('g', 'project', nodes=[n.asjson() for n in nodes], edges=[e.asjson() for e in edges])
+  app = Flask(__name__)
+  graph_api.add_graph_handler(app, lambda datasetid, type: g)
+  return app.test_client()
+
+
+def _ids(r, key='nodes'):
+  return [n['id'] for n in r.get_json()[key]]
+
+
+def test_neighborhood(graph_client):
+  r = graph_client.get('/graph/g/neighborhood?node=1')
+  assert _ids(r) == [1, 2, 0]
+  assert _ids(r, 'edges') == [1, 0]
+  assert _ids(graph_client.get('/graph/g/neighborhood?node=0&k=2&direction=out')) == [0, 1, 4, 2]
+  assert _ids(graph_client.get('/graph/g/neighborhood?node=0&k=2&direction=out&edge_type=link')) == [0, 1, 2]
+  r = graph_client.get('/graph/g/neighborhood?node=0&k=3&max_nodes=2')
+  assert _ids(r) == [0, 1] and r.get_json()['truncated']
+  assert graph_client.get('/graph/g/neighborhood').status_code == 400
+  assert graph_client.get('/graph/g/neighborhood?node=0&direction=up').status_code == 400
+
+
+def test_subgraph_and_path(graph_client):
+  r = graph_client.post('/graph/g/subgraph', data={'node[]': ['0', '1', '4', '42']})
+  assert _ids(r) == [0, 1, 4]
+  assert _ids(r, 'edges') == [0, 3]
+
+  r = graph_client.get('/graph/g/path?source=0&target=3')
+  assert _ids(r) == [0, 1, 2, 3]
+  assert _ids(r, 'edges') == [0, 1, 2]
+  assert graph_client.get('/graph/g/path?source=3&target=0').status_code == 404
+  assert _ids(graph_client.get('/graph/g/path?source=3&target=0&direction=both')) == [3, 2, 1, 0]
+  assert graph_client.get('/graph/g/path?source=0&target=3&max_depth=2').status_code == 404
+
+  assert [e['id'] for e in graph_client.get('/graph/g/edge?type=other').get_json()] == [3]
+
+
+@pytest.fixture
+def small_chunks():
+  from phovea_server.config import view
+  cc = view('phovea_server.graph')
+  old = cc.getint('stream_chunk_size')
+  cc.set('stream_chunk_size', 2)
+  yield
+  cc.set('stream_chunk_size', old)
+
+
+def test_streamed_data(small_chunks):
+  from phovea_server.columnar_graph import ColumnarGraph
+  from phovea_server.util import to_json
+  nodes = [dict(id=i, type='node', attrs=dict(x=i)) for i in range(5)]
+  edges = [dict(id=i, type='link', source=i, target=i + 1, attrs={}) for i in range(4)]
+  graphs = dict(indexed=IndexedGraph('g', 'project', nodes=[GraphNode('node', n['id'], n['attrs']) for n in nodes],
+                                     edges=[GraphEdge('link', e['id'], e['source'], e['target']) for e in edges]),
+                columnar=ColumnarGraph('g', 'project', nodes=nodes, edges=edges),
+                empty=IndexedGraph('g', 'project'))
+  app = Flask(__name__)
+  graph_api.add_graph_handler(app, lambda datasetid, type: graphs[datasetid])
+  client = app.test_client()
+  for name, g in graphs.items():
+    r = client.get('/graph/{0}/data'.format(name))
+    # the test client always reports is_streamed, streamed responses have no content length
+    assert r.headers.get('Content-Length') is None
+    assert r.get_data(as_text=True) == to_json(g.asjson())
+    assert client.get('/graph/{0}/node'.format(name)).get_data(as_text=True) == to_json(g.asjson()['nodes'])
+
+
+def test_data_etag(graph_client):
+  r = graph_client.get('/graph/g/data')
+  etag = r.headers['ETag']
+  assert graph_client.get('/graph/g/data', headers={'If-None-Match': etag}).status_code == 304
+  assert graph_client.get('/graph/g/data?format=json', headers={'If-None-Match': etag}).status_code == 200
+  assert graph_client.delete('/graph/g/edge/3').status_code == 200
+  assert graph_client.get('/graph/g/data', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_data_etag_recreated():
+  graphs = dict(g=IndexedGraph('g', 'project', nodes=[GraphNode('node', 0)]))
+  app = Flask(__name__)
+  graph_api.add_graph_handler(app, lambda datasetid, type: graphs[datasetid])
+  client = app.test_client()
+  etag = client.get('/graph/g/data').headers['ETag']
+  # a new graph with the same id and a different content
+  graphs['g'] = IndexedGraph('g', 'project', nodes=[GraphNode('node', 1)])
+  r = client.get('/graph/g/data', headers={'If-None-Match': etag})
+  assert r.status_code == 200
+  assert r.headers['ETag'] != etag
+
+  # graphs changing outside of this process use the body based etag
+  from tests.test_graph import StoreGraph
+  graphs['g'] = StoreGraph()
+  r = client.get('/graph/g/data')
+  assert r.headers['ETag'] and not r.headers['ETag'].startswith(graph_api._process_token)
+
+
+def test_pretty_print(graph_client):
+  r = graph_client.get('/graph/g/data?f_pretty_print=true')
+  # buffered instead of streamed
+  assert r.headers.get('Content-Length') is not None
+  assert r.get_json() == graph_client.get('/graph/g/data').get_json()
+
+
+def test_batch(graph_client):
+  operations = [dict(op='add', type='node', data=dict(id=5)),
+                dict(op='add', type='edge', data=dict(id=4, source=4, target=5)),
+                dict(op='add', type='node', data=dict(id=0)),
+                dict(op='remove', type='edge', id=0),
+                dict(op='update', type='node', data=dict(id=1, attrs=dict(x=1))),
+                dict(op='rename', type='node', data=dict(id=1)),
+                dict(op='remove', type='node')]
+  r = graph_client.post('/graph/g/batch', json=dict(operations=operations))
+  assert r.get_json() == dict(results=['ok', 'ok', 'failed', 'ok', 'ok', 'invalid', 'invalid'], size=[6, 4])
+  assert graph_client.get('/graph/g/node/1').get_json()['attrs'] == dict(x=1)
+  assert graph_client.get('/graph/g').get_json()['size'] == [6, 4]
+  assert graph_client.post('/graph/g/batch', json=dict(operations='add')).status_code == 400
+
+
+def test_batch_unknown_size():
+  from tests.test_graph import StoreGraph
+  g = StoreGraph()
+  app = Flask(__name__)
+  graph_api.add_graph_handler(app, lambda datasetid, type: g)
+  r = app.test_client().post('/graph/g/batch', json=[dict(op='add', type='node', data=dict(id=0))])
+  # the size of graphs changing elsewhere is left out instead of loading the whole graph
+  assert r.get_json() == dict(results=['ok'])
+
+
+def test_stream_upload(small_chunks):
+  import json
+  g = IndexedGraph('g', 'project', nodes=[GraphNode('node', 0)])
+  app = Flask(__name__)
+  # the streaming upload is not limited by the maximal size of regular uploads
+  app.config['MAX_CONTENT_LENGTH'] = 16
+  graph_api.add_graph_handler(app, lambda datasetid, type: g)
+  client = app.test_client()
+  body = json.dumps(dict(name='g', nodes=[dict(id=i) for i in range(5)], edges=[dict(id=i, source=i, target=i + 1) for i in range(5)]))
+  r = client.post('/graph/g/stream', data=body, content_type='application/json')
+  assert r.get_json() == dict(results=dict(ok=8, failed=2), size=[5, 4])
+  assert client.post('/graph/g/stream', data='{"nodes": [1', content_type='application/json').status_code == 400
+
+
+def test_stream_upload_create(small_chunks, monkeypatch):
+  import io
+  import json
+  from phovea_server import dataset
+  from phovea_server.config import view
+  graphs = {}
+
+  def add(desc, files, id=None):
+    graphs[id] = IndexedGraph(desc['name'], 'project', id)
+    return graphs[id]
+
+  monkeypatch.setattr(dataset, 'add', add)
+  app = Flask(__name__)
+  graph_api.add_graph_handler(app, lambda datasetid, type: graphs.get(datasetid) or flask_abort(404))
+  client = app.test_client()
+  body = json.dumps(dict(attrs=dict(x=1), nodes=[dict(id=i) for i in range(3)], edges=[dict(id=0, source=0, target=1)]))
+  r = client.post('/graph/new/stream?name=New', data=body, content_type='application/json')
+  assert r.get_json() == dict(results=dict(ok=4), size=[3, 1])
+  assert graphs['new'].name == 'New'
+  assert graphs['new'].attrs == dict(x=1)
+
+  # the read bytes are limited, too, e.g. of chunked requests without a content length
+  cc = view('phovea_server.graph')
+  old = cc.getint('max_stream_size')
+  cc.set('max_stream_size', 32)
+  try:
+    r = client.post('/graph/new/stream', input_stream=io.BytesIO(body.encode('utf-8')), content_type='application/json',
+                    environ_overrides={'wsgi.input_terminated': True, 'CONTENT_LENGTH': ''})
+    assert r.status_code == 413
+  finally:
+    cc.set('max_stream_size', old)
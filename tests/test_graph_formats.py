@@ -0,0 +1,69 @@
+import io
+import json
+import pytest
+from werkzeug.datastructures import FileStorage
+from phovea_server import graph_formats, plugin
+from phovea_server.graph import IndexedGraph, GraphNode, GraphEdge, _guess_format
+from phovea_server.columnar_graph import ColumnarGraph
+
+
+@pytest.fixture(autouse=True)
+def registry():
+  # loads the plugin registry together with the configuration
+  plugin.list()
+
+
+def _graph():
+  nodes = [GraphNode('person' if i % 2 else 'place', i, dict(name='n<{0}>'.format(i), rank=i) if i < 3 else {})
+           for i in range(4)]
+  edges = [GraphEdge('link', 10 + i, i, i + 1, dict(weight=i + 0.5, active=i % 2 == 0)) for i in range(3)]
+  return IndexedGraph('g', 'project', nodes=nodes, edges=edges)
+
+
+def _parse(parser, response):
+  return parser({}, [FileStorage(io.BytesIO(response.get_data()), filename='graph')])
+
+
+@pytest.mark.parametrize('format', ['graphml', 'npz'])
+def test_round_trip(format):
+  g = _graph()
+  parsed = _parse(getattr(graph_formats, 'parse_' + format), getattr(graph_formats, 'format_' + format)(g, {}))
+  assert dict(nodes=parsed['nodes'], edges=parsed['edges']) == g.asjson()
+
+
+def test_npz_columnar():
+  g = _graph()
+  c = ColumnarGraph('g', 'project', nodes=g.asjson()['nodes'], edges=g.asjson()['edges'])
+  parsed = _parse(graph_formats.parse_npz, graph_formats.format_npz(c, {}))
+  assert dict(nodes=parsed['nodes'], edges=parsed['edges']) == g.asjson()
+
+
+def test_csv():
+  g = _graph()
+  r = graph_formats.format_csv(g, {})
+  assert r.get_data(as_text=True).splitlines()[:2] == ['id,source,target,type,weight,active', '10,0,1,link,0.5,True']
+  parsed = _parse(graph_formats.parse_csv, r)
+  assert [(e['id'], e['source'], e['target'], e['attrs']['weight']) for e in parsed['edges']] == \
+      [(e.id, e.source, e.target, e.attrs['weight']) for e in g.edges()]
+  assert [n['id'] for n in parsed['nodes']] == [0, 1, 2, 3]
+
+  parsed = graph_formats.parse_csv(dict(desc='source;target\na;b\nb;c\n', delimiter=';'), [])
+  assert [(e['id'], e['source'], e['target']) for e in parsed['edges']] == [(0, 'a', 'b'), (1, 'b', 'c')]
+  with pytest.raises(ValueError):
+    graph_formats.parse_csv(dict(desc='from,to\n1,2\n'), [])
+  with pytest.raises(ValueError, match='line 3'):
+    graph_formats.parse_csv(dict(desc='source,target,type\n1,2,link\n2,3\n'), [])
+
+
+def test_json_upload():
+  from phovea_server.graph import parse
+  graph = dict(nodes=[dict(type='node', id=0, attrs={}), dict(type='node', id=1, attrs={})],
+               edges=[dict(type='edge', id=0, source=0, target=1, attrs={})])
+  f = FileStorage(io.BytesIO(json.dumps(graph).encode('utf-8')), filename='g.json')
+  assert parse(dict(name='g'), [f]) == dict(name='g', **graph)
+
+
+def test_guess_format():
+  assert _guess_format(None, [FileStorage(io.BytesIO(), filename='g.GraphML')]) == 'graphml'
+  assert _guess_format('csv', []) == 'csv'
+  assert _guess_format(None, []) == 'json'
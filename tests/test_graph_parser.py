@@ -0,0 +1,44 @@
+import io
+import json
+import pytest
+from werkzeug.datastructures import FileStorage
+from phovea_server import graph_parser
+
+
+class SlowStream(io.BytesIO):
+  # returns at most 3 bytes per read to split values and multi byte characters
+  def read(self, size=-1):
+    return super(SlowStream, self).read(3)
+
+
+def test_iter_json_graph():
+  graph = dict(name='ä graph', nodes=[dict(id=i, attrs=dict(label='ü' * i)) for i in range(5)], size=12345,
+               edges=[dict(id=0, source=0, target=1)], attrs=dict(nested=[1.5, None, True]))
+  items = list(graph_parser.iter_json_graph(SlowStream(json.dumps(graph, ensure_ascii=False).encode('utf-8')), 2))
+  assert [(k, len(v)) for k, v in items if k in ('nodes', 'edges')] == [('nodes', 2), ('nodes', 2), ('nodes', 1), ('edges', 1)]
+  assert [(k, v) for k, v in items if k not in ('nodes', 'edges')] == [('name', 'ä graph'), ('size', 12345), ('attrs', graph['attrs'])]
+
+  assert list(graph_parser.iter_json_graph(io.BytesIO(b' { } '))) == []
+  with pytest.raises(ValueError):
+    list(graph_parser.iter_json_graph(io.BytesIO(b'{"nodes": [{"id": 1}')))
+
+
+def test_parse_batches():
+  from phovea_server import plugin
+  from phovea_server.graph import parse_batches, IndexedGraph
+  plugin.list()
+  graph = dict(nodes=[dict(id=i) for i in range(3)], edges=[dict(id=0, source=0, target=1)])
+  f = FileStorage(io.BytesIO(json.dumps(graph).encode('utf-8')), filename='g.json')
+  assert [(k, len(v)) for k, v in parse_batches({}, [f], 2)] == [('nodes', 2), ('nodes', 1), ('edges', 1)]
+  # formats without batch parser are split into batches
+  f = FileStorage(io.BytesIO(b'source,target\n0,1\n1,2\n'), filename='g.csv')
+  g = IndexedGraph('g', 'project')
+  assert g.load_batches(parse_batches({}, [f], 2)) == dict(ok=5)
+  assert [g.nnodes, g.nedges] == [3, 2]
+  assert parse_batches(dict(format='unknown'), []) is None
+
+
+def test_parse_json_stream():
+  graph = dict(name='g', nodes=[dict(id=0)], edges=[])
+  f = FileStorage(io.BytesIO(json.dumps(graph).encode('utf-8')), filename='g.json')
+  assert graph_parser.parse_json_stream({}, [f]) == graph
@@ -1,5 +1,5 @@
 import pytest
-from phovea_server.mapper import MappingManager
+from phovea_server.mapper import MappingManager, MappingCache
 
 
 @pytest.fixture(scope="module")
@@ -103,6 +103,280 @@ def test_transitive_merge_mapping(mapper):
   assert mapper('ID5', 'ID7', [2, 4]) == [[2, 4, 6, 4, 8, 12, 6, 12, 18], [4, 8, 12, 8, 16, 24, 12, 24, 36]]
 
 
+def test_transitive_mapping_with_unmapped_ids():
+  mapper = MappingManager([
+    ('A', 'B', KeyedMappingTable(lambda ids: {id: [id, id + 10] for id in ids if id != 2})),
+    ('B', 'C', OneToMoreMappingTable('B', 'C'))
+  ])
+  assert mapper('A', 'C', [1, 2, 3]) == [[1, 2, 3, 11, 22, 33], [], [3, 6, 9, 13, 26, 39]]
+
+
+def test_csr_mapping():
+  import numpy as np
+  mapper = MappingManager([
+    ('ID5', 'ID6', CSROneToMoreMappingTable()),
+    ('ID6', 'ID7', CSROneToMoreMappingTable()),
+    ('ID7', 'ID8', OneToMoreMappingTable('ID7', 'ID8'))
+  ])
+  assert mapper('ID5', 'ID6', [2, 4]) == [[2, 4, 6], [4, 8, 12]]
+  assert mapper('ID5', 'ID7', [2, 4]) == [[2, 4, 6, 4, 8, 12, 6, 12, 18], [4, 8, 12, 8, 16, 24, 12, 24, 36]]
+  assert mapper('ID6', 'ID8', [1]) == [[1, 2, 3, 2, 4, 6, 3, 6, 9]]
+
+  values, offsets = mapper.map_csr('ID5', 'ID7', [2, 4])
+  assert values.tolist() == [2, 4, 6, 4, 8, 12, 6, 12, 18, 4, 8, 12, 8, 16, 24, 12, 24, 36]
+  assert offsets.tolist() == [0, 9, 18]
+  values, offsets = mapper.map_csr('ID5', 'ID5', ['a', 'b'])
+  assert values.tolist() == ['a', 'b'] and offsets.tolist() == [0, 1, 2]
+  values, offsets = mapper.map_csr('ID8', 'ID5', ['a'])
+  assert len(values) == 0 and offsets.tolist() == [0, 0]
+  assert isinstance(offsets, np.ndarray)
+
+
+def test_csr_conversion():
+  from phovea_server.mapper import lists_to_csr, csr_to_lists
+  values, offsets = lists_to_csr([['a'], [], None, ['b', 'c']])
+  assert values.tolist() == ['a', 'b', 'c']
+  assert offsets.tolist() == [0, 1, 1, 1, 3]
+  assert csr_to_lists(values, offsets) == [['a'], [], [], ['b', 'c']]
+  assert csr_to_lists(*lists_to_csr([])) == []
+
+
+class CSROneToMoreMappingTable(object):
+  csr_results = True
+
+  def __call__(self, ids):
+    import numpy as np
+    ids = ids.astype(np.int64)
+    values = np.stack([ids, ids * 2, ids * 3], axis=1).ravel()
+    return values, np.arange(0, len(ids) * 3 + 1, 3)
+
+
+def test_weighted_path_selection():
+  providers = [
+    ('A', 'D', CostMappingTable(10)),
+    ('A', 'B', CostMappingTable(2)),
+    ('B', 'D', CostMappingTable(3)),
+    ('A', 'C', CostMappingTable(2)),
+    ('C', 'D', CostMappingTable(2))
+  ]
+  assert MappingManager(providers).path('A', 'D') == ['A', 'C', 'D']
+  # without cost hints the path with the fewest hops is used
+  assert MappingManager([(a, b, OneToOneMappingTable(a, b)) for a, b, _ in providers]).path('A', 'D') == ['A', 'D']
+  # multiple mappers of an edge are summed up unless they are called concurrently
+  providers.append(('A', 'C', CostMappingTable(2)))
+  assert MappingManager(providers).path('A', 'D') == ['A', 'B', 'D']
+  assert MappingManager(providers, concurrent=True).path('A', 'D') == ['A', 'C', 'D']
+
+
+def test_learned_path_costs():
+  mapper = MappingManager([
+    ('A', 'C', SlowMappingTable(0.05, ['slow'])),
+    ('A', 'B', OneToOneMappingTable('A', 'B')),
+    ('B', 'C', OneToOneMappingTable('B', 'C'))
+  ], learn_costs=True)
+  assert mapper.path('A', 'C') == ['A', 'C']
+  assert mapper('A', 'C', [1]) == [['slow']]
+  # the direct edge turned out to be slower than the two fast hops
+  assert mapper.path('A', 'C') == ['A', 'B', 'C']
+  assert mapper('A', 'C', [1]) == [[1]]
+
+
+def test_snapshot():
+  import json
+  providers = [
+    ('A', 'B', CostMappingTable(1)),
+    ('B', 'C', OneToOneMappingTable('B', 'C')),
+    ('A', 'C', CostMappingTable(5))
+  ]
+  snapshot = json.loads(json.dumps(MappingManager(providers).to_snapshot('fp')))
+  assert snapshot['fingerprint'] == 'fp'
+  loaded = []
+
+  def load():
+    loaded.append(True)
+    return providers
+
+  restored = MappingManager.from_snapshot(snapshot, load)
+  assert restored.known_idtypes() == set(['A', 'B', 'C'])
+  assert set(restored.maps_to('A')) == set(['B', 'C'])
+  assert restored.path('A', 'C') == ['A', 'B', 'C']
+  assert not loaded
+  # providers are loaded on the first mapping
+  assert restored('A', 'C', [1]) == [[1]]
+  assert loaded == [True]
+
+
+def test_outdated_snapshot():
+  snapshot = MappingManager([('A', 'B', OneToOneMappingTable('A', 'B'))]).to_snapshot()
+  outdated = []
+  restored = MappingManager.from_snapshot(snapshot, lambda: [('A', 'C', OneToOneMappingTable('A', 'C'))], on_outdated=outdated.append)
+  assert restored.maps_to('A') == ['B']
+  assert restored('A', 'C', [1]) == [[1]]
+  assert outdated == [restored]
+  assert restored.maps_to('A') == ['C']
+
+
+class CostMappingTable(object):
+  preserves_order = True
+
+  def __init__(self, cost):
+    self.cost = cost
+
+  def __call__(self, ids):
+    return [[id] for id in ids]
+
+
+def test_cached_mapping():
+  table = CountingMappingTable()
+  cache = MappingCache(max_size=3)
+  mapper = MappingManager([('A', 'B', table), ('B', 'C', OneToOneMappingTable('B', 'C'))], cache=cache)
+  assert mapper('A', 'C', [1, 2, 1]) == [[2], [4], [2]]
+  # duplicates within a batch are resolved once
+  assert table.calls == [[1, 2]]
+  assert mapper('A', 'C', [2, 3]) == [[4], [6]]
+  # only the misses are passed to the mappers
+  assert table.calls[-1] == [3]
+  assert mapper.cache_stats()['hits'] == 1
+  assert mapper.cache_stats()['misses'] == 4
+  assert len(cache) == 3
+  # bounded by the maximal size, the least recently used id 1 gets evicted
+  mapper('A', 'C', [4])
+  assert len(cache) == 3
+  mapper('A', 'C', [1])
+  assert table.calls[-1] == [1]
+
+
+def test_cached_mapping_invalidation():
+  table = CountingMappingTable()
+  mapper = MappingManager([('A', 'B', table), ('C', 'D', OneToOneMappingTable('C', 'D'))], cache=MappingCache())
+  mapper('A', 'B', [1])
+  mapper('C', 'D', [1])
+  mapper.invalidate('D')
+  mapper('A', 'B', [1])
+  assert len(table.calls) == 1
+  mapper.invalidate('A')
+  mapper('A', 'B', [1])
+  assert len(table.calls) == 2
+  mapper.invalidate()
+  mapper('A', 'B', [1])
+  assert len(table.calls) == 3
+
+
+def test_cached_mapping_ttl():
+  table = CountingMappingTable()
+  cache = MappingCache(ttl=60)
+  mapper = MappingManager([('A', 'B', table)], cache=cache)
+  mapper('A', 'B', [1])
+  mapper('A', 'B', [1])
+  assert len(table.calls) == 1
+  cache.ttl = -1  # expire all entries that get added from now on
+  mapper.invalidate()
+  mapper('A', 'B', [1])
+  mapper('A', 'B', [1])
+  assert len(table.calls) == 3
+
+
+def test_keyed_mapping():
+  dict_table = KeyedMappingTable(lambda ids: {id: [id * 2] for id in ids if id != 3})
+  pair_table = KeyedMappingTable(lambda ids: (list(reversed(ids)), [[id * 3] for id in reversed(ids)]))
+  mapper = MappingManager([('A', 'B', dict_table), ('A', 'C', pair_table), ('B', 'C', pair_table)])
+  assert mapper('A', 'B', [1, 2, 1, 3]) == [[2], [4], [2], []]
+  # called once with the unique ids
+  assert dict_table.calls == [[1, 2, 3]]
+  assert mapper('A', 'C', [1, 2, 1]) == [[3], [6], [3]]
+  assert mapper('B', 'C', [2, 1]) == [[6], [3]]
+
+
+def test_concurrent_mapping():
+  import time
+  providers = [('A', 'B', SlowMappingTable(0.2, [1, 2])), ('A', 'B', SlowMappingTable(0.1, [2, 3])), ('A', 'B', SlowMappingTable(0.2, [3, 4]))]
+  sequential = MappingManager(providers)
+  concurrent = MappingManager(providers, concurrent=True)
+  start = time.time()
+  assert concurrent('A', 'B', ['x', 'y']) == sequential('A', 'B', ['x', 'y']) == [[1, 2, 3, 4], [1, 2, 3, 4]]
+  assert time.time() - start < 0.8
+
+
+def test_concurrent_mapping_timeout():
+  providers = [('A', 'B', SlowMappingTable(0, [1])), ('A', 'B', SlowMappingTable(1, [2])), ('A', 'B', SlowMappingTable(0, [3]))]
+  mapper = MappingManager(providers, concurrent=True, timeout=0.2)
+  assert mapper('A', 'B', ['x']) == [[1, 3]]
+
+
+def test_search():
+  a = SearchMappingTable(['TP53', 'tp53bp1', 'ATP5'])
+  b = SearchMappingTable(['tp5', 'TP53', 'atp53x', 'BRCA1'])
+  plain = MappingManager([('A', 'B', a), ('A', 'B', b)])
+  indexed = MappingManager([('A', 'B', a), ('A', 'B', b)], search_index=True)
+  expected = ['tp5', 'TP53', 'tp53bp1', 'ATP5', 'atp53x']
+  assert plain.search('A', 'B', 'tp5') == expected
+  a.search_calls = 0
+  assert indexed.search('A', 'B', 'tp5') == expected
+  assert indexed.search('A', 'B', 'tp5', 2) == expected[:2]
+  assert indexed.search('A', 'B', 'p53') == ['atp53x', 'TP53', 'tp53bp1']
+  assert a.search_calls == 0
+
+  # rebuild the index of the changed mapper
+  b.names.append('tp5x')
+  b.search_version = 1
+  assert indexed.search('A', 'B', 'tp5x') == ['tp5x']
+
+
+class SearchMappingTable(object):
+  search_version = 0
+
+  def __init__(self, names):
+    self.names = names
+    self.search_calls = 0
+
+  def __call__(self, ids):
+    return [[id] for id in ids]
+
+  def search_keys(self):
+    return self.names
+
+  def search(self, query, max_results=None):
+    self.search_calls += 1
+    r = [n for n in self.names if query.lower() in n.lower()]
+    return r if max_results is None else r[:max_results]
+
+
+class SlowMappingTable(object):
+  preserves_order = True
+
+  def __init__(self, delay, result):
+    self.delay = delay
+    self.result = result
+
+  def __call__(self, ids):
+    import time
+    time.sleep(self.delay)
+    return [list(self.result) for _ in ids]
+
+
+class KeyedMappingTable(object):
+  keyed_results = True
+
+  def __init__(self, f):
+    self.f = f
+    self.calls = []
+
+  def __call__(self, ids):
+    self.calls.append(list(ids))
+    return self.f(ids)
+
+
+class CountingMappingTable(object):
+  preserves_order = True
+
+  def __init__(self):
+    self.calls = []
+
+  def __call__(self, ids):
+    self.calls.append(list(ids))
+    return [[id * 2] for id in ids]
+
+
 class OneToOneMappingTable(object):
   def __init__(self, from_idtype, to_idtype):
     self.from_idtype = from_idtype
@@ -137,3 +411,43 @@ class OneToMoreMappingTable(object):
 
   def __call__(self, ids):
     return [[id, id*2, id*3] for id in ids]
+
+
+def _all_paths(graph, start, end, path=[]):
+  # reference implementation of the former exhaustive path enumeration
+  path = path + [start]
+  if start == end:
+    return [path]
+  paths = []
+  for node in graph.get(start, []):
+    if node not in path:
+      paths.extend(_all_paths(graph, node, end, path))
+  return sorted(paths, key=len)
+
+
+def test_shortest_path_matches_exhaustive_search():
+  import random
+  rnd = random.Random(42)
+  idtypes = ['T{}'.format(i) for i in range(7)]
+  for _ in range(20):
+    edges = [(a, b) for a in idtypes for b in idtypes if a != b and rnd.random() < 0.3]
+    mapper = MappingManager([(a, b, OneToOneMappingTable(a, b)) for a, b in edges])
+    # uniform cost hints select the same paths
+    weighted = MappingManager([(a, b, CostMappingTable(1)) for a, b in edges])
+    graph = {}
+    for a, b in edges:
+      graph.setdefault(a, []).append(b)
+    for a in idtypes:
+      expected = {b: _all_paths(graph, a, b) for b in idtypes if b != a}
+      expected = {b: p for b, p in expected.items() if p}
+      assert set(mapper.maps_to(a)) == set(expected.keys())
+      for b in idtypes:
+        paths = expected.get(b)
+        assert mapper.can_map(a, b) == weighted.can_map(a, b) == (paths[:1] if paths else None)
+
+
+def test_can_map(mapper):
+  assert mapper.can_map('ID1', 'ID3') == [['ID1', 'ID2', 'ID3']]
+  assert mapper.can_map('ID5', 'ID7') == [['ID5', 'ID6', 'ID7']]
+  assert mapper.can_map('ID7', 'ID5') is None
+  assert mapper.can_map('unknown', 'ID1') is None
@@ -0,0 +1,72 @@
+import itertools
+from phovea_server import security
+from phovea_server.security import User, can_read, filter_readable
+
+
+def _user(name, roles):
+  u = User(name)
+  u.name = name
+  u.roles = roles
+  return u
+
+
+def test_filter_readable_matches_can_read():
+  users = [_user('Alice', ['Admins', 'anonymous']), _user('bob', ['users']), security.ANONYMOUS_USER]
+  combinations = itertools.product(['alice', 'BOB', None], ['admins', 'Users', ''], [['ALICE'], [], [None, 'bob']],
+                                   [744, 700, 7000, 70, 0, '640'])
+  items = [dict(creator=c, group=g, buddies=b, permissions=p) for c, g, b, p in combinations]
+  items.append(dict(creator='bob'))
+
+  for user in users:
+    expected = [i for i in items if can_read(i, user)]
+    assert list(filter_readable(items, user)) == expected
+    assert 0 < len(expected) < len(items)
+
+
+def test_filter_readable_key():
+  class Entry(object):
+    def __init__(self, desc):
+      self.desc = desc
+
+  entries = [Entry(dict(creator='alice', permissions=700)), Entry(dict(creator='bob', permissions=700))]
+  assert list(filter_readable(entries, _user('bob', []), key=lambda e: e.desc)) == entries[1:]
+
+
+class CountingManager(security.SecurityManager):
+  def __init__(self):
+    super(CountingManager, self).__init__()
+    self.user = _user('alice', ['users'])
+    self.lookups = 0
+
+  @property
+  def current_user(self):
+    self.lookups += 1
+    return self.user
+
+  def logout(self):
+    self.user = security.ANONYMOUS_USER
+
+
+def test_current_user_request_cache(monkeypatch):
+  from flask import Flask
+  m = CountingManager()
+  monkeypatch.setattr(security.p, 'lookup', lambda singleton_id: m)
+  monkeypatch.setattr(security, '_manager', None)
+  app = Flask(__name__)
+
+  with app.test_request_context():
+    assert security.current_username() == 'alice'
+    assert security.current_user() is m.user
+    assert all(security.can_read(dict(creator='alice', permissions=700)) for _ in range(3))
+    assert m.lookups == 1
+    assert security.saved_lookups() == 4
+    security.manager().logout()
+    assert security.current_user() is security.ANONYMOUS_USER
+    assert m.lookups == 2
+
+  # every request resolves the user again
+  with app.test_request_context():
+    security.current_user()
+    assert m.lookups == 3
+  security.current_user()
+  assert m.lookups == 4